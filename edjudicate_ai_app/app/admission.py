@@ -0,0 +1,182 @@
+import asyncio
+import json
+import math
+import time
+from collections import deque
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+
+QUEUE_DEPTH = metrics.gauge("admission_queue_depth", "Requests waiting for admission.", ("lane",))
+IN_FLIGHT = metrics.gauge("admission_in_flight", "Requests currently admitted.", ("lane",))
+WAIT_SECONDS = metrics.histogram("admission_wait_seconds", "Time requests spent queued before admission.", ("lane",))
+SERVICE_SECONDS = metrics.histogram("admission_service_seconds", "Time admitted requests held their slot.", ("lane",))
+REJECTED = metrics.counter("admission_rejected_total", "Requests turned away by admission control.", ("lane", "reason"))
+
+DEFAULT_LANES = {
+    "ingestion": {
+        "paths": ["/upload_docs", "/hackrx/run", "/api/v1/hackrx/run"],
+        "max_concurrent": 2,
+        "max_queue": 8,
+        "queue_timeout": 30,
+    },
+    "query": {
+        "paths": ["/query", "/query/batch", "/query/federated"],
+        "max_concurrent": 8,
+        "max_queue": 32,
+        "queue_timeout": 10,
+    },
+    "batch": {
+        "paths": ["/claims/batch"],
+        "max_concurrent": 1,
+        "max_queue": 4,
+        "queue_timeout": 30,
+    },
+}
+
+
+class Rejected(Exception):
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Lane:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters = deque()
+
+    def retry_after(self):
+        """Rough seconds until a queued slot frees up, from recent service times."""
+        p50 = SERVICE_SECONDS.labels(lane=self.name).quantile(0.5) or 1.0
+        return max(1, math.ceil(p50 * (len(self.waiters) + 1) / self.max_concurrent))
+
+
+class AdmissionController:
+    """Per-lane concurrency limits with bounded FIFO queues, under an overall
+    cap of ``performance.max_concurrent_requests``.
+
+    All state is touched only from the event loop, so no locks are needed.
+    """
+
+    def __init__(self, lanes, global_limit):
+        self.lanes = {}
+        self.routes = {}
+        for name, spec in lanes.items():
+            lane = Lane(name, int(spec["max_concurrent"]), int(spec["max_queue"]), float(spec["queue_timeout"]))
+            self.lanes[name] = lane
+            for path in spec.get("paths", []):
+                self.routes[path] = lane
+        self.global_limit = global_limit
+        self.total = 0
+
+    def lane_for(self, path):
+        return self.routes.get(path.rstrip("/") or "/")
+
+    def _can_start(self, lane):
+        return lane.active < lane.max_concurrent and self.total < self.global_limit
+
+    def _start(self, lane):
+        lane.active += 1
+        self.total += 1
+        IN_FLIGHT.labels(lane=lane.name).set(lane.active)
+
+    def _publish_depth(self, lane):
+        QUEUE_DEPTH.labels(lane=lane.name).set(len(lane.waiters))
+
+    async def acquire(self, lane):
+        start = time.perf_counter()
+        if not lane.waiters and self._can_start(lane):
+            self._start(lane)
+            WAIT_SECONDS.labels(lane=lane.name).observe(0.0)
+            return
+        if len(lane.waiters) >= lane.max_queue:
+            REJECTED.labels(lane=lane.name, reason="queue_full").inc()
+            raise Rejected(429, f"Too many pending {lane.name} requests", lane.retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        lane.waiters.append(fut)
+        self._publish_depth(lane)
+        try:
+            await asyncio.wait_for(fut, lane.queue_timeout)
+        except asyncio.TimeoutError:
+            REJECTED.labels(lane=lane.name, reason="queue_timeout").inc()
+            raise Rejected(503, f"Timed out waiting for a {lane.name} slot", lane.retry_after())
+        except BaseException:
+            # Client went away after we were granted a slot: hand it back.
+            if fut.done() and not fut.cancelled():
+                self.release(lane)
+            raise
+        finally:
+            if fut in lane.waiters:
+                lane.waiters.remove(fut)
+            self._publish_depth(lane)
+        WAIT_SECONDS.labels(lane=lane.name).observe(time.perf_counter() - start)
+
+    def release(self, lane):
+        lane.active -= 1
+        self.total -= 1
+        IN_FLIGHT.labels(lane=lane.name).set(lane.active)
+        self._dispatch()
+
+    def _dispatch(self):
+        for lane in self.lanes.values():
+            while lane.waiters and self._can_start(lane):
+                fut = lane.waiters.popleft()
+                if fut.done():
+                    continue
+                self._start(lane)
+                fut.set_result(None)
+            self._publish_depth(lane)
+
+
+def controller_from_config():
+    lanes = get_setting("performance", "admission", default=None) or DEFAULT_LANES
+    global_limit = int(get_setting("performance", "max_concurrent_requests", default=10))
+    return AdmissionController(lanes, global_limit)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that queues or rejects requests before they reach the
+    embed/search/LLM path. Routes not assigned to a lane pass straight through."""
+
+    def __init__(self, app, controller=None):
+        self.app = app
+        self.controller = controller or controller_from_config()
+
+    async def __call__(self, scope, receive, send):
+        lane = self.controller.lane_for(scope["path"]) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire(lane)
+        except Rejected as e:
+            await _send_rejection(send, e)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            SERVICE_SECONDS.labels(lane=lane.name).observe(time.perf_counter() - start)
+            self.controller.release(lane)
+
+
+async def _send_rejection(send, error):
+    body = json.dumps({"detail": error.detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": error.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(error.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
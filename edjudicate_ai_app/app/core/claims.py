@@ -0,0 +1,188 @@
+"""Batch adjudication of claim queries against one session.
+
+Claims are read from CSV (a ``query`` column, optional ``claim_id``) or
+JSONL (``{"claim_id": ..., "query": ...}``). Each batch is embedded and
+searched in one pass, then decided by concurrent LLM calls; records are
+appended to a JSONL file as they complete, so a rerun over the same output
+skips claims already decided.
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.embedder import embed_texts
+from edjudicate_ai_app.app.core.locks import RWFileLock
+from edjudicate_ai_app.app.core.engine import decide_from_chunks
+from edjudicate_ai_app.app.core.retriever import search_chunks
+from edjudicate_ai_app.app.core.sessions import DATA_DIR
+
+CONCURRENCY = int(get_setting("claims", "concurrency", default=8))
+BATCH = int(get_setting("claims", "batch", default=64))
+K = int(get_setting("claims", "k", default=5))
+JOBS_DIR = get_setting("claims", "jobs_directory", default=os.path.join(DATA_DIR, "claims"))
+
+CLAIMS = metrics.counter("claims_adjudicated_total", "Batch claims decided, by outcome.", ("result",))
+CLAIM_SECONDS = metrics.histogram("claim_latency_seconds", "Per-claim time from batch retrieval to decision.")
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def read_claims(data, filename=""):
+    """Parse claim rows from CSV or JSONL text (JSONL if ``filename`` ends in
+    .jsonl/.ndjson or the first line is a JSON object). Rows without a
+    claim_id are numbered from 1."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    first = data.lstrip()[:1]
+    if filename.lower().endswith((".jsonl", ".ndjson")) or first == "{":
+        rows = []
+        for n, line in enumerate((line for line in data.splitlines() if line.strip()), 1):
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"Claim row {n}: invalid JSON ({e})") from None
+    else:
+        rows = list(csv.DictReader(io.StringIO(data)))
+    claims = []
+    for n, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            raise ValueError(f"Claim row {n}: expected a JSON object")
+        query = (row.get("query") or "")
+        query = query.strip() if isinstance(query, str) else ""
+        if not query:
+            raise ValueError(f"Claim row {n} has no query")
+        claims.append({"claim_id": str(row.get("claim_id") or row.get("id") or n), "query": query})
+    return claims
+
+
+def done_claims(path):
+    """Claim ids already decided in a results file (resume support). Claims
+    recorded with an error are left out so a rerun retries them."""
+    done = set()
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record.get("error") is None:
+                        done.add(record["claim_id"])
+                except (ValueError, KeyError, AttributeError):
+                    # A line cut short by an interrupted run; that claim is redone
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def parse_decision(raw):
+    """The model's JSON decision, or None if it did not return valid JSON."""
+    try:
+        decision = json.loads(_FENCE.sub("", raw))
+    except (TypeError, ValueError):
+        return None
+    return decision if isinstance(decision, dict) else None
+
+
+def _decide(claim, clauses, started):
+    record = {"claim_id": claim["claim_id"], "query": claim["query"]}
+    try:
+        raw = decide_from_chunks(claim["query"], clauses)
+        decision = parse_decision(raw)
+        record["decision"] = decision if decision is not None else {"raw": raw}
+        record["error"] = None if decision is not None else "Model did not return valid JSON"
+    except Exception as e:
+        record["decision"] = None
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["clauses"] = clauses
+    record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+def _end_partial_line(path):
+    # An interrupted run may have left half a record; start on a fresh line
+    try:
+        with open(path, "rb+") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    except FileNotFoundError:
+        pass
+
+
+def _job_lock(output):
+    return RWFileLock(os.path.abspath(output) + ".lock")
+
+
+def job_running(output):
+    """True while another run (in any worker) is appending to ``output``."""
+    with _job_lock(output).try_write() as acquired:
+        return not acquired
+
+
+def adjudicate(claims, session_id, output, concurrency=CONCURRENCY, batch=BATCH, k=K):
+    """Decide ``claims`` against ``session_id``, appending one JSON line per
+    claim to ``output`` and yielding each record as it completes. Claims
+    already decided in ``output`` are skipped; failed ones are retried and
+    appended again, so the latest line for a claim is its result. At most ``concurrency`` LLM calls run
+    at once; retrieval for the next batch waits until the current one has
+    been decided, so memory stays bounded. Runs over the same ``output``
+    take turns on a file lock, so a second run resumes after the first."""
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with _job_lock(output).write():
+        yield from _adjudicate(claims, session_id, output, concurrency, batch, k)
+
+
+def _adjudicate(claims, session_id, output, concurrency, batch, k):
+    done = done_claims(output)
+    todo = [claim for claim in claims if claim["claim_id"] not in done]
+    _end_partial_line(output)
+    with open(output, "a") as out, ThreadPoolExecutor(concurrency, thread_name_prefix="claims") as pool:
+        for start in range(0, len(todo), batch):
+            group = todo[start:start + batch]
+            started = time.perf_counter()
+            queries = [claim["query"] for claim in group]
+            vectors = np.asarray(embed_texts(queries), dtype="float32")
+            hits = search_chunks(vectors, session_id, k=k, queries=queries)
+            futures = [pool.submit(_decide, claim, [chunk for chunk, _ in found], started)
+                       for claim, found in zip(group, hits)]
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                CLAIMS.labels(result="error" if record["error"] else "ok").inc()
+                CLAIM_SECONDS.observe(record["latency_ms"] / 1000)
+                yield record
+
+
+def summarize(records, elapsed, skipped=0):
+    """Throughput and latency percentiles for a finished run."""
+    latencies = np.array([r["latency_ms"] for r in records]) if records else np.zeros(0)
+    return {
+        "claims": len(records),
+        "skipped": skipped,
+        "errors": sum(1 for r in records if r["error"]),
+        "elapsed_s": round(elapsed, 2),
+        "claims_per_s": round(len(records) / elapsed, 2) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 1),
+            "p95": round(float(np.percentile(latencies, 95)), 1),
+            "max": round(float(latencies.max()), 1),
+        } if len(latencies) else None,
+    }
+
+
+def job_path(job_id):
+    """Results file of a /claims/batch job; ids are limited to safe characters."""
+    if not re.fullmatch(r"[A-Za-z0-9_.-]{1,100}", job_id):
+        raise ValueError("job_id may only contain letters, digits, '.', '_' and '-'")
+    return os.path.join(JOBS_DIR, f"{job_id}.jsonl")
@@ -0,0 +1,74 @@
+import re
+
+import numpy as np
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.embedder import embed_texts
+from edjudicate_ai_app.app.core.metrics import timed
+
+ENABLED = bool(get_setting("compression", "enabled", default=False))
+BUDGET_CHARS = int(get_setting("compression", "budget_chars", default=1200))
+NEIGHBORS = int(get_setting("compression", "neighbors", default=1))
+
+COMPRESSION_RATIO = metrics.histogram(
+    "prompt_compression_ratio", "Compressed / original clause characters per prompt.",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0))
+CHARS_SAVED = metrics.counter("prompt_compression_chars_saved_total", "Clause characters removed from prompts.")
+
+# Sentence ends, list separators and line breaks; chunks are raw PDF text
+_SPLIT = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SPLIT.split(text) if s and s.strip()]
+
+
+@timed("compress")
+def compress_chunks(query, chunks, budget_chars=BUDGET_CHARS, neighbors=NEIGHBORS):
+    """Keep the sentences of ``chunks`` most similar to ``query``, each with
+    up to ``neighbors`` sentences either side for context, until about
+    ``budget_chars`` characters are selected.
+
+    The query and every sentence are embedded in one batch. Returns one
+    string per chunk that kept anything, sentences in their original order
+    and gaps marked with "...".
+    """
+    original = sum(len(c) for c in chunks)
+    if original <= budget_chars:
+        return list(chunks)
+
+    sentences = [(c, i, s) for c, chunk in enumerate(chunks) for i, s in enumerate(split_sentences(chunk))]
+    if not sentences:
+        return list(chunks)
+    vectors = np.asarray(embed_texts([query] + [s for _, _, s in sentences]), dtype="float32")
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    scores = vectors[1:] @ vectors[0]
+
+    position = {(c, i): n for n, (c, i, _) in enumerate(sentences)}
+    kept, used = set(), 0
+    for n in np.argsort(-scores):
+        c, i, _ = sentences[n]
+        for j in range(i - neighbors, i + neighbors + 1):
+            m = position.get((c, j))
+            if m is None or m in kept:
+                continue
+            kept.add(m)
+            used += len(sentences[m][2]) + 1
+        if used >= budget_chars:
+            break
+
+    compressed, last = {}, None
+    for n in sorted(kept):
+        c, i, text = sentences[n]
+        parts = compressed.setdefault(c, [])
+        if parts and last != (c, i - 1):
+            parts.append("...")
+        parts.append(text)
+        last = (c, i)
+    result = [" ".join(compressed[c]) for c in sorted(compressed)]
+
+    size = sum(len(r) for r in result)
+    COMPRESSION_RATIO.observe(size / original)
+    CHARS_SAVED.inc(max(0, original - size))
+    return result
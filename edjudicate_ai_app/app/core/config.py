@@ -0,0 +1,32 @@
+import os
+import yaml
+
+_CONFIG_CANDIDATES = (
+    "config/config.yaml",
+    os.path.join(os.path.dirname(__file__), "..", "..", "config", "config.yaml"),
+)
+
+
+def load_config() -> dict:
+    """Load config.yaml from the working directory, falling back to the copy
+    shipped next to the app package. Returns an empty dict if none is found."""
+    for path in _CONFIG_CANDIDATES:
+        try:
+            with open(path) as f:
+                return yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            continue
+    return {}
+
+
+cfg = load_config()
+
+
+def get_setting(*keys, default=None):
+    """Walk nested config sections, e.g. get_setting("performance", "request_timeout")."""
+    node = cfg
+    for key in keys:
+        if not isinstance(node, dict) or key not in node:
+            return default
+        node = node[key]
+    return node
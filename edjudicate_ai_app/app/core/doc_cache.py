@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+
+DOC_CACHE_RESULTS = metrics.counter(
+    "document_cache_total",
+    "Document URL cache outcomes: fresh, revalidated (304), same_content (200 with known hash) or miss.",
+    ("result",),
+)
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    session_id: str
+    content_hash: str
+    etag: str | None = None
+    last_modified: str | None = None
+    validated_at: float = 0.0
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def session_id_for(digest: str) -> str:
+    """Content-addressed session id, so identical documents share one index
+    even when fetched through different (e.g. differently signed) URLs."""
+    return f"doc_{digest[:16]}"
+
+
+class DocumentCache:
+    """URL -> indexed-session map kept as small JSON files.
+
+    ``urls/`` is keyed by a hash of the URL and holds the HTTP validators;
+    ``content/`` maps a document hash to the session already built for it.
+    """
+
+    def __init__(self, directory, max_age=0, index_exists=None):
+        self.directory = directory
+        self.max_age = max_age
+        self._index_exists = index_exists or (lambda session_id: True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, kind, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _write(path, data):
+        # Created on first write, so merely importing the app leaves no directories behind
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def get(self, url) -> CacheEntry | None:
+        data = self._read(self._path("urls", url))
+        if data is None:
+            return None
+        entry = CacheEntry(**data)
+        # The session may have been cleaned up since; treat that as a miss.
+        if not self._index_exists(entry.session_id):
+            return None
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.validated_at < self.max_age
+
+    @staticmethod
+    def conditional_headers(entry: CacheEntry | None) -> dict:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def put(self, entry: CacheEntry):
+        entry.validated_at = time.time()
+        self._write(self._path("urls", entry.url), asdict(entry))
+        self._write(self._path("content", entry.content_hash), {"session_id": entry.session_id})
+
+    def session_for_content(self, digest) -> str | None:
+        data = self._read(self._path("content", digest))
+        if data and self._index_exists(data["session_id"]):
+            return data["session_id"]
+        return None
+
+    def lock(self, digest) -> threading.Lock:
+        """Serialises indexing of the same document within this process."""
+        with self._locks_guard:
+            return self._locks.setdefault(digest, threading.Lock())
+
+
+def cache_from_config(index_exists=None):
+    if not get_setting("document_cache", "enabled", default=True):
+        return None
+    return DocumentCache(
+        get_setting("document_cache", "directory", default=os.path.join("data", "url_cache")),
+        max_age=float(get_setting("document_cache", "max_age", default=0)),
+        index_exists=index_exists,
+    )
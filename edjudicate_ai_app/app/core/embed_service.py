@@ -0,0 +1,247 @@
+"""Local embedding server shared by every worker on the host.
+
+One process loads the sentence-transformer and serves ``embed_texts`` calls
+over a Unix socket, merging concurrent requests into batches. Run it with
+
+    python -m edjudicate_ai_app.app.core.embed_service
+
+Wire format (little endian). Request: ``b"EMB1"``, uint32 count, ``count``
+uint32 byte lengths, then the UTF-8 texts back to back. Response:
+``b"EMB1"``, uint32 status; on status 0, uint32 count, uint32 dim and
+``count * dim`` float32 values; otherwise uint32 length and an error message.
+"""
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from edjudicate_ai_app.app.core.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EMB1"
+_HEADER = struct.Struct("<4sI")
+_SHAPE = struct.Struct("<II")
+_LENGTH = struct.Struct("<I")
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+SOCKET_PATH = get_setting("embedding_service", "socket", default="/tmp/edjudicate_embed.sock")
+
+
+class EmbeddingServiceError(RuntimeError):
+    """The server answered but could not embed the request."""
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    while n:
+        read = sock.recv_into(view[-n:], n)
+        if not read:
+            raise ConnectionError("Embedding service closed the connection")
+        n -= read
+    return bytes(buf)
+
+
+def encode_request(texts):
+    encoded = [t.encode("utf-8") for t in texts]
+    return b"".join([
+        _HEADER.pack(MAGIC, len(encoded)),
+        struct.pack(f"<{len(encoded)}I", *map(len, encoded)),
+        *encoded,
+    ])
+
+
+def read_request(sock):
+    magic, count = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Bad request header")
+    lengths = struct.unpack(f"<{count}I", _recv_exact(sock, 4 * count)) if count else ()
+    blob = _recv_exact(sock, sum(lengths))
+    texts, offset = [], 0
+    for length in lengths:
+        texts.append(blob[offset:offset + length].decode("utf-8"))
+        offset += length
+    return texts
+
+
+def read_response(sock):
+    magic, status = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if magic != MAGIC:
+        raise ConnectionError("Bad response header")
+    if status != STATUS_OK:
+        (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+        raise EmbeddingServiceError(_recv_exact(sock, length).decode("utf-8", "replace"))
+    count, dim = _SHAPE.unpack(_recv_exact(sock, _SHAPE.size))
+    return np.frombuffer(_recv_exact(sock, count * dim * 4), dtype="<f4").reshape(count, dim)
+
+
+class _Batcher:
+    """Merges concurrent requests into model batches.
+
+    The first waiting request opens a batch; others join until it holds
+    ``max_batch`` texts or ``max_wait`` seconds have passed, so a lone
+    request pays at most ``max_wait`` extra latency.
+    """
+
+    def __init__(self, encode, max_batch=64, max_wait=0.005):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="embed-batcher", daemon=True).start()
+
+    def submit(self, texts):
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [t for item_texts, _ in batch for t in item_texts]
+            try:
+                vectors = np.asarray(self.encode(texts), dtype="<f4") if texts else None
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            logger.debug("Embedded %d texts from %d requests", len(texts), len(batch))
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)] if item_texts else
+                                  np.zeros((0, 0), dtype="<f4"))
+                offset += len(item_texts)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Connections are persistent: serve requests until the client hangs up
+        while True:
+            try:
+                texts = read_request(self.request)
+            except (ConnectionError, ValueError):
+                return
+            try:
+                vectors = np.ascontiguousarray(self.server.batcher.submit(texts).result())
+                payload = _HEADER.pack(MAGIC, STATUS_OK) + _SHAPE.pack(*vectors.shape) + vectors.tobytes()
+            except Exception as e:
+                message = str(e).encode("utf-8")
+                payload = _HEADER.pack(MAGIC, STATUS_ERROR) + _LENGTH.pack(len(message)) + message
+            self.request.sendall(payload)
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, encode, max_batch=64, max_wait=0.005):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+        self.batcher = _Batcher(encode, max_batch, max_wait)
+
+
+class EmbeddingClient:
+    """Client for the embedding server; one persistent connection per thread.
+
+    ``encode`` has the SentenceTransformer call shape so it can stand in for
+    the model object.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def embed(self, texts) -> np.ndarray:
+        sock = getattr(self._local, "sock", None)
+        for attempt in range(2):
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                sock.sendall(encode_request(texts))
+                return read_response(sock)
+            except (ConnectionError, BrokenPipeError, socket.timeout) as e:
+                # A stale pooled connection (server restarted) gets one retry
+                sock.close()
+                sock = self._local.sock = None
+                if attempt or isinstance(e, socket.timeout):
+                    raise
+
+    def encode(self, texts, convert_to_tensor=False, **kwargs):
+        return self.embed(list(texts))
+
+
+def _pin_threads(threads, cpus):
+    """Restrict the server to ``cpus`` and size the math thread pools to match."""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if not threads:
+        threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    return threads
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    threads = _pin_threads(
+        int(get_setting("embedding_service", "threads", default=0)),
+        get_setting("embedding_service", "cpus", default=None),
+    )
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(get_setting("models", "embeddings", "model_name", default="all-MiniLM-L6-v2"))
+
+    server = EmbeddingServer(
+        SOCKET_PATH,
+        lambda texts: model.encode(texts, convert_to_tensor=False),
+        max_batch=int(get_setting("embedding_service", "max_batch", default=64)),
+        max_wait=float(get_setting("embedding_service", "max_wait_ms", default=5)) / 1000,
+    )
+    logger.info("Embedding service listening on %s with %d threads", SOCKET_PATH, threads)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(SOCKET_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,25 @@
+import logging
+import time
+
 from sentence_transformers import SentenceTransformer
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.embed_service import EmbeddingClient, EmbeddingServiceError
+from edjudicate_ai_app.app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+EMBED_BACKEND = metrics.counter("embed_requests_total", "embed_texts calls by backend.", ("backend",))
 
 _embedder = None
 
+# Shared embedding server (embedding_service.enabled); None embeds in-process
+_service = EmbeddingClient(
+    timeout=float(get_setting("embedding_service", "timeout", default=30)),
+) if get_setting("embedding_service", "enabled", default=False) else None
+_RETRY_AFTER = float(get_setting("embedding_service", "retry_after", default=30))
+_service_down_until = 0.0
+
 
 def _get_model():
     global _embedder
@@ -10,6 +28,31 @@ def _get_model():
     return _embedder
 
 
+def _embed_via_service(texts):
+    """Embed through the shared server; None if it is unreachable, in which
+    case it is skipped for `retry_after` seconds, or fails the request."""
+    global _service_down_until
+    if _service is None or time.monotonic() < _service_down_until:
+        return None
+    try:
+        vectors = _service.embed(texts)
+    except OSError as e:
+        _service_down_until = time.monotonic() + _RETRY_AFTER
+        logger.warning("Embedding service unavailable (%s); embedding in-process", e)
+        return None
+    except EmbeddingServiceError as e:
+        # The server is up, so only this request falls back
+        logger.warning("Embedding service error (%s); embedding in-process", e)
+        return None
+    EMBED_BACKEND.labels(backend="service").inc()
+    return vectors
+
+
+@timed("embed")
 def embed_texts(texts):
+    vectors = _embed_via_service(list(texts))
+    if vectors is not None:
+        return vectors.tolist()
+    EMBED_BACKEND.labels(backend="local").inc()
     model = _get_model()
-    return model.encode(texts, convert_to_tensor=False).tolist()
\ No newline at end of file
+    return model.encode(texts, convert_to_tensor=False).tolist()
@@ -2,7 +2,10 @@ import google.generativeai as genai
 import yaml
 import json
 import os
-from edjudicate_ai_app.app.core.retriever import retrieve_chunks
+from edjudicate_ai_app.app.core.retriever import retrieve_chunks, search_chunks
+from edjudicate_ai_app.app.core.embedder import embed_texts
+from edjudicate_ai_app.app.core.llm import Deadline, generate
+from edjudicate_ai_app.app.core import compress
 
 api_key = None
 try:
@@ -22,6 +25,27 @@ genai.configure(api_key=api_key)
 
 model = genai.GenerativeModel("gemini-2.0-flash")
 
+
+def _call_gemini(prompt: str, timeout: float) -> str:
+    response = model.generate_content(prompt, request_options={"timeout": timeout})
+    return response.candidates[0].content.parts[0].text
+
+_llm = _call_gemini
+
+
+def set_llm(call):
+    """Replace the LLM call ``(prompt, timeout) -> text``, e.g. with
+    ``fake_llm.fake_llm`` for offline runs; ``None`` restores Gemini."""
+    global _llm
+    _llm = call or _call_gemini
+
+
+def _format_clauses(question, chunks):
+    if compress.ENABLED:
+        # Read at call time so the settings can be changed at runtime (e.g. by evaluations)
+        chunks = compress.compress_chunks(question, chunks, compress.BUDGET_CHARS, compress.NEIGHBORS)
+    return "\n\n".join(chunks)
+
 COT = """
 You are a claims evaluation assistant. You are provided with:
 - A customer query
@@ -50,13 +74,10 @@ Retrieved Clauses:
 ✅ Just return valid JSON. No triple backticks.
 """
 
-def evaluate_decision(query, session_id):
+def evaluate_decision(query, session_id, deadline: Deadline | None = None):
     retrieved_chunks = retrieve_chunks(query,session_id)
-    clauses = "\n\n".join(retrieved_chunks)
-    prompt = COT.format(query=query, clauses=clauses)
-    response = model.generate_content(prompt)
     #raw_output = 
-    return response.candidates[0].content.parts[0].text
+    return decide_from_chunks(query, retrieved_chunks, deadline=deadline)
 
     # try:
     #     parsed_output = json.loads(raw_output)
@@ -77,6 +98,41 @@ def evaluate_decision(query, session_id):
 #
 
 
+def decide_from_chunks(query: str, retrieved_chunks: list, deadline: Deadline | None = None) -> str:
+    """Claim decision (raw JSON text) from clauses the caller already retrieved."""
+    clauses = _format_clauses(query, retrieved_chunks)
+    prompt = COT.format(query=query, clauses=clauses)
+    return generate(_llm, prompt, deadline=deadline)
+
+
+def _decision_or_error(query, hits, deadline):
+    chunks = [chunk for chunk, _ in hits]
+    result = {"query": query, "retrieved_clauses": chunks, "retrieval_scores": [score for _, score in hits]}
+    try:
+        result["response"] = decide_from_chunks(query, chunks, deadline=deadline)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def evaluate_decisions(queries: list, session_id: str, k: int = 5, deadline: Deadline | None = None) -> list:
+    """`evaluate_decision` for many queries against one session.
+
+    The queries are embedded together and searched with one index load and
+    one matrix search, then decided concurrently. Results come back in input
+    order; a failed decision carries an ``error`` instead of failing the
+    whole batch.
+    """
+    if not queries:
+        return []
+    # pipeline imports this module, so its shared pool is looked up here
+    from edjudicate_ai_app.app.core.pipeline import submit
+
+    hits = search_chunks(embed_texts(list(queries)), session_id, k, list(queries))
+    futures = [submit(_decision_or_error, q, found, deadline) for q, found in zip(queries, hits)]
+    return [f.result() for f in futures]
+
+
 QA_PROMPT = """
 You are a helpful policy QA assistant. Using ONLY the provided policy excerpts, answer the user's question concisely in 1-3 sentences.
 
@@ -90,13 +146,18 @@ Policy Excerpts:
 {clauses}
 """
 
-def answer_question(question: str, session_id: str, k: int = 5) -> str:
+def answer_question(question: str, session_id: str, k: int = 5, deadline: Deadline | None = None) -> str:
     """Answer a question using retrieved chunks from the FAISS index for the given session.
 
-    Returns plain text suitable for the HackRx expected `answers` array.
+    `deadline` is the caller's remaining request budget; the LLM call is
+    bounded by it. Returns plain text suitable for the HackRx expected `answers` array.
     """
     retrieved_chunks = retrieve_chunks(question, session_id, k=k)
-    clauses = "\n\n".join(retrieved_chunks)
+    return answer_from_chunks(question, retrieved_chunks, deadline=deadline)
+
+
+def answer_from_chunks(question: str, retrieved_chunks: list, deadline: Deadline | None = None) -> str:
+    """Answer a question from clauses the caller already retrieved."""
+    clauses = _format_clauses(question, retrieved_chunks)
     prompt = QA_PROMPT.format(question=question, clauses=clauses)
-    response = model.generate_content(prompt)
-    return response.candidates[0].content.parts[0].text
\ No newline at end of file
+    return generate(_llm, prompt, deadline=deadline)
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""Deterministic stand-in for Gemini, for offline evaluation and load tests.
+
+It answers a QA prompt with the excerpt sentence sharing the most words
+with the question, and a claims prompt with JSON built the same way, so
+results depend only on what the prompt contains. Install with
+``engine.set_llm(fake_llm)``.
+"""
+import json
+import re
+
+NOT_FOUND = "Information not found in the provided document."
+
+_SECTIONS = re.compile(
+    r"(?:Question|Query):\s*(?P<question>.*?)\n\s*(?:Policy Excerpts|Retrieved Clauses):\s*(?P<clauses>.*)",
+    re.S,
+)
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+_SENTENCE = re.compile(r"(?<=[.!?;])\s+|\n+")
+_STOPWORDS = frozenset("a an and are as at be by does for from how in is it of on or the this to what which with".split())
+
+
+def _words(text):
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def best_sentence(question, clauses):
+    """The clause sentence with the largest word overlap with ``question``."""
+    wanted = _words(question)
+    best, best_overlap = None, 0
+    for sentence in _SENTENCE.split(clauses):
+        overlap = len(wanted & _words(sentence))
+        if overlap > best_overlap:
+            best, best_overlap = sentence.strip(), overlap
+    return best
+
+
+def fake_llm(prompt: str, timeout: float = None) -> str:
+    match = _SECTIONS.search(prompt)
+    if not match:
+        return NOT_FOUND
+    # Drop the instructions that follow the clauses in the claims prompt
+    clauses = match.group("clauses").split("\n---", 1)[0]
+    sentence = best_sentence(match.group("question"), clauses)
+    if "Retrieved Clauses:" in prompt:
+        return json.dumps({
+            "decision": "approved" if sentence else "rejected",
+            "amount": None,
+            "justification": sentence or "No matching clause found.",
+        })
+    return sentence or NOT_FOUND
@@ -0,0 +1,190 @@
+import contextvars
+import heapq
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+
+from edjudicate_ai_app.app.core import metrics, section_index
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.embedder import embed_texts
+from edjudicate_ai_app.app.core.locks import RWFileLock
+from edjudicate_ai_app.app.core.metrics import timed
+from edjudicate_ai_app.app.core.retriever import (
+    PROVENANCE_FILE, STORE, build_index, index_exists, load_index, search_hits,
+)
+from edjudicate_ai_app.app.core.sessions import DATA_DIR, backup_dir, registry
+from edjudicate_ai_app.app.ingestion.sections import append_chunks, file_chunks
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_ENABLED = bool(get_setting("library", "enabled", default=False))
+LIBRARY_DIR = get_setting("library", "directory", default=os.path.join(DATA_DIR, "docs"))
+LIBRARY_SESSION = get_setting("library", "session_id", default="library")
+LIBRARY_MANIFEST = "library.json"
+
+WORKERS = int(get_setting("retrieval", "federated", "workers", default=8))
+MAX_SESSIONS = int(get_setting("retrieval", "federated", "max_sessions", default=200))
+MAX_K = int(get_setting("retrieval", "federated", "max_k", default=50))
+
+SESSIONS_SEARCHED = metrics.histogram("federated_sessions_searched", "Sessions searched per federated query.",
+                                      buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+
+# The library is rebuilt only when data/docs changes and is never evicted
+registry.pin(LIBRARY_SESSION)
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="federated")
+
+
+def _library_files(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith((".pdf", ".docx"))
+    )
+
+
+def _manifest(files):
+    return [
+        {"name": os.path.basename(path), "size": os.path.getsize(path), "mtime_ns": os.stat(path).st_mtime_ns}
+        for path in files
+    ]
+
+
+def _manifest_path():
+    return os.path.join(backup_dir(LIBRARY_SESSION), LIBRARY_MANIFEST)
+
+
+def _stored_manifest():
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+@timed("library_build")
+def build_library(directory=LIBRARY_DIR, force=False):
+    """(Re)build the library session from the PDF/DOCX files in ``directory``
+    unless its index already matches their names, sizes and mtimes. Workers
+    starting together build it once. Returns True if it was rebuilt."""
+    files = _library_files(directory)
+    manifest = _manifest(files)
+    with RWFileLock(os.path.join(DATA_DIR, ".locks", "library-build.lock")).write():
+        if not force and index_exists(LIBRARY_SESSION) and _stored_manifest() == manifest:
+            return False
+        if not files:
+            logger.warning("Policy library %s has no documents", directory)
+            return False
+
+        chunks, sources, sections = [], [], ([], [], [])
+        for document, path in enumerate(files):
+            pieces = file_chunks(path)
+            append_chunks(pieces, document, chunks, sections)
+            sources.extend((os.path.basename(path), i) for i in range(len(pieces)))
+        build_index(chunks, LIBRARY_SESSION, True, sources, sections if section_index.ENABLED else None)
+
+        path = _manifest_path()
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+    logger.info("Built policy library from %d documents (%d chunks)", len(files), len(chunks))
+    return True
+
+
+def load_library():
+    """Startup hook: build the library if it is missing or stale, then load
+    its index once so the first query does not pay for it."""
+    if not LIBRARY_ENABLED:
+        return
+    build_library()
+    if STORE is None and index_exists(LIBRARY_SESSION):
+        load_index(LIBRARY_SESSION)
+
+
+@lru_cache(maxsize=256)
+def _sources(path, stamp):
+    with open(path) as f:
+        return json.load(f)["sources"]
+
+
+def _provenance(session_id, chunk_id):
+    """Document and section a chunk came from, where the session recorded them."""
+    document = section = None
+    path = os.path.join(backup_dir(session_id), PROVENANCE_FILE)
+    try:
+        source = _sources(path, os.stat(path).st_mtime_ns)[chunk_id][0]
+        if isinstance(source, list):
+            document = source[0]
+    except (FileNotFoundError, IndexError, KeyError, json.JSONDecodeError):
+        pass
+    sections = section_index.load_sections(backup_dir(session_id))
+    if sections is not None and chunk_id < sections.nchunks:
+        section = sections.titles[sections.section_of(chunk_id)] or None
+    return document, section
+
+
+def _search_session(session_id, q_vecs, k, query):
+    try:
+        return session_id, search_hits(q_vecs, session_id, k, [query])[0]
+    except FileNotFoundError:
+        return session_id, None
+    except Exception:
+        # A damaged or incompatible index costs this session, not the query
+        logger.exception("Federated search failed for session %s", session_id)
+        return session_id, None
+
+
+@timed("federated_search")
+def federated_search(query, session_ids=None, k=5, include_library=True):
+    """Search ``query`` across several sessions at once.
+
+    ``session_ids`` defaults to every indexed session, cut to
+    ``max_sessions``; an explicit list longer than that raises
+    ValueError. The policy library is added unless excluded. ``k`` is
+    clamped to ``max_k``. The query is embedded once, sessions are searched
+    in parallel and their ranked hits are merged with a heap. Returns
+    (hits, missing, omitted): hits are dicts with the chunk, its score and
+    its provenance, best first; missing lists the sessions that have no
+    index or could not be searched; omitted counts the indexed sessions left
+    out of a default search.
+    """
+    k = min(max(1, k), MAX_K)
+    omitted = 0
+    if session_ids is None:
+        session_ids = [s for s in registry.sessions() if s != LIBRARY_SESSION]
+        omitted = max(0, len(session_ids) - MAX_SESSIONS)
+        session_ids = session_ids[:MAX_SESSIONS]
+    session_ids = list(dict.fromkeys(session_ids))
+    if len(session_ids) > MAX_SESSIONS:
+        raise ValueError(f"At most {MAX_SESSIONS} sessions can be searched at once")
+    if include_library and LIBRARY_ENABLED and LIBRARY_SESSION not in session_ids:
+        session_ids.append(LIBRARY_SESSION)
+    SESSIONS_SEARCHED.observe(len(session_ids))
+
+    q_vecs = embed_texts([query])
+    # One context copy per task, so stage timings reach the request
+    futures = [_pool.submit(contextvars.copy_context().run, _search_session, s, q_vecs, k, query)
+               for s in session_ids]
+    results = [f.result() for f in futures]
+    missing = [session_id for session_id, hits in results if hits is None]
+    ranked = (
+        [(-score, session_id, chunk_id, chunk) for chunk_id, chunk, score in hits]
+        for session_id, hits in results if hits
+    )
+
+    merged = []
+    for negated, session_id, chunk_id, chunk in islice(heapq.merge(*ranked), k):
+        document, section = _provenance(session_id, chunk_id)
+        merged.append({
+            "session_id": session_id,
+            "document": document,
+            "section": section,
+            "chunk_id": chunk_id,
+            "chunk": chunk,
+            "score": -negated,
+        })
+    return merged, missing, omitted
@@ -0,0 +1,135 @@
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from edjudicate_ai_app.app.core.metrics import timed
+
+BM25_FILE = "bm25.npz"
+
+# Words plus numbers with dotted parts, so "4.2", "30" and plan codes survive
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have if in is it its of on or that the this to was "
+    "were will with what which who does do my i under".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a session's chunks, stored as CSR postings.
+
+    ``indptr[t]:indptr[t + 1]`` slices ``doc_ids``/``tfs`` for term ``t``;
+    scoring a query is one vectorised add per query term.
+    """
+
+    def __init__(self, terms, indptr, doc_ids, tfs, doc_len, k1=1.2, b=0.75):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        n = len(doc_len)
+        df = np.diff(indptr)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype("float32")
+        avg = doc_len.mean() if n else 1.0
+        # Per-document length normalisation, precomputed once per load
+        self.norm = (k1 * (1 - b + b * doc_len / max(avg, 1e-9))).astype("float32")
+
+    @classmethod
+    def build(cls, chunks):
+        postings = {}
+        doc_len = np.zeros(len(chunks), dtype="float32")
+        for doc, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            doc_len[doc] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc, tf))
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype="int64")
+        np.cumsum([len(postings[t]) for t in terms], out=indptr[1:])
+        flat = [p for t in terms for p in postings[t]]
+        doc_ids = np.array([d for d, _ in flat], dtype="int32")
+        tfs = np.array([tf for _, tf in flat], dtype="float32")
+        return cls(terms, indptr, doc_ids, tfs, doc_len)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, terms=np.array(self.terms, dtype=str), indptr=self.indptr,
+                     doc_ids=self.doc_ids, tfs=self.tfs, doc_len=self.doc_len)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["terms"].tolist(), data["indptr"], data["doc_ids"], data["tfs"], data["doc_len"])
+
+    def scores(self, query):
+        scores = np.zeros(len(self.doc_len), dtype="float32")
+        for token in set(tokenize(query)):
+            t = self.vocab.get(token)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            docs, tf = self.doc_ids[lo:hi], self.tfs[lo:hi]
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + self.norm[docs])
+        return scores
+
+    @timed("lexical")
+    def search(self, query, k):
+        """Top-k (scores, chunk ids) for one query; only chunks sharing a term
+        with the query are returned."""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return scores[hits], hits
+
+
+@lru_cache(maxsize=64)
+def _load(path, stamp):
+    return BM25Index.load(path)
+
+
+def load_bm25(directory):
+    """The session's BM25 index, or None for sessions built without one."""
+    path = os.path.join(directory, BM25_FILE)
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load(path, stamp)
+
+
+def rrf(rankings, k, rrf_k=60):
+    """Reciprocal rank fusion of several ranked id arrays; returns (scores, ids)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            fused[int(doc)] = fused.get(int(doc), 0.0) + 1.0 / (rrf_k + rank + 1)
+    top = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return np.array([s for _, s in top], dtype="float32"), np.array([d for d, _ in top], dtype="int64")
+
+
+def weighted(dense, lexical, k, weight=0.5):
+    """Blend max-normalised dense and BM25 scores, ``weight`` going to dense.
+    Each argument is a (scores, ids) pair; returns (scores, ids)."""
+    fused = {}
+    for (scores, ids), w in ((dense, weight), (lexical, 1.0 - weight)):
+        top = float(scores.max()) if len(scores) else 0.0
+        if top <= 0:
+            continue
+        for score, doc in zip(scores, ids):
+            fused[int(doc)] = fused.get(int(doc), 0.0) + w * float(score) / top
+    top = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return np.array([s for _, s in top], dtype="float32"), np.array([d for d, _ in top], dtype="int64")
@@ -0,0 +1,192 @@
+import contextvars
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions as gexc
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.ratelimit import RateLimitTimeout, estimate_tokens, governor
+
+logger = logging.getLogger(__name__)
+
+_llm_cfg = get_setting("performance", "llm", default={}) or {}
+
+CALL_TIMEOUT = float(_llm_cfg.get("call_timeout", 30))
+MAX_RETRIES = int(_llm_cfg.get("max_retries", 2))
+BACKOFF_BASE = float(_llm_cfg.get("backoff_base", 0.5))
+BACKOFF_MAX = float(_llm_cfg.get("backoff_max", 8))
+HEDGE_ENABLED = bool(_llm_cfg.get("hedge", False))
+HEDGE_QUANTILE = float(_llm_cfg.get("hedge_quantile", 0.95))
+HEDGE_MIN_SAMPLES = int(_llm_cfg.get("hedge_min_samples", 20))
+EXPECTED_OUTPUT_TOKENS = int(_llm_cfg.get("expected_output_tokens", 256))
+
+# Errors worth retrying: quota / overload responses from the provider and
+# calls that ran past their per-attempt timeout. RateLimitTimeout is also a
+# TimeoutError but is never retried: the local quota already said no.
+TRANSIENT_ERRORS = (
+    gexc.TooManyRequests,
+    gexc.ResourceExhausted,
+    gexc.ServiceUnavailable,
+    gexc.InternalServerError,
+    gexc.GatewayTimeout,
+    gexc.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+LLM_CALL_SECONDS = metrics.histogram(
+    "llm_call_seconds", "Latency of individual LLM provider calls.", ("outcome",))
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "llm_request_seconds", "End-to-end latency of generate() including retries and hedges.")
+LLM_RETRIES = metrics.counter("llm_retries_total", "LLM attempts retried after a transient error.")
+LLM_HEDGES = metrics.counter("llm_hedges_total", "Hedged LLM calls fired, by which call won.", ("winner",))
+
+_executor = ThreadPoolExecutor(max_workers=int(_llm_cfg.get("max_workers", 16)), thread_name_prefix="llm")
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request budget ran out before the LLM produced an answer."""
+
+
+class AttemptTimeout(TimeoutError):
+    """An attempt ran past its timeout; ``pending`` are its provider calls
+    that are still running (and still holding their governor slots)."""
+
+    def __init__(self, message, pending):
+        super().__init__(message)
+        self.pending = pending
+
+
+class Deadline:
+    """Monotonic time budget shared by every LLM call made for one request."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def request_deadline() -> Deadline:
+    return Deadline(float(get_setting("performance", "request_timeout", default=300)))
+
+
+def _timed_call(call, prompt, timeout, blocking=True):
+    with governor.slot(timeout, blocking=blocking):
+        start = time.perf_counter()
+        try:
+            result = call(prompt, timeout)
+        except Exception:
+            LLM_CALL_SECONDS.labels(outcome="error").observe(time.perf_counter() - start)
+            raise
+        LLM_CALL_SECONDS.labels(outcome="ok").observe(time.perf_counter() - start)
+        return result
+
+
+def _submit(call, prompt, timeout, blocking=True):
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, _timed_call, call, prompt, timeout, blocking)
+
+
+def hedge_delay():
+    """Delay before firing a duplicate call, or None if hedging is off or we
+    have not seen enough successful calls to trust the latency estimate."""
+    if not HEDGE_ENABLED:
+        return None
+    ok = LLM_CALL_SECONDS.labels(outcome="ok")
+    if ok.count < HEDGE_MIN_SAMPLES:
+        return None
+    return ok.quantile(HEDGE_QUANTILE)
+
+
+def _attempt(call, prompt, timeout, tokens):
+    start = time.monotonic()
+    pending = {_submit(call, prompt, timeout)}
+    primary = next(iter(pending))
+
+    hedged = False
+    delay = hedge_delay()
+    if delay is not None and delay < timeout:
+        done, _ = wait(pending, timeout=delay)
+        # Hedges never queue: they only fire when quota and a slot are free now.
+        if not done and governor.try_acquire(tokens):
+            pending.add(_submit(call, prompt, timeout - (time.monotonic() - start), blocking=False))
+            hedged = True
+
+    error = None
+    while pending:
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                if hedged:
+                    LLM_HEDGES.labels(winner="primary" if fut is primary else "hedge").inc()
+                return fut.result()
+            if error is None or fut is primary:
+                error = fut.exception()
+    if error is not None and not pending:
+        raise error
+    raise AttemptTimeout(f"LLM call exceeded {timeout:.1f}s", pending)
+
+
+def _await_stale(pending, deadline):
+    """Wait for calls left running by a timed-out attempt, so a retry never
+    holds a second slot next to them. Returns a late answer if one arrives."""
+    done, pending = wait(pending, timeout=deadline.remaining())
+    for fut in done:
+        if fut.exception() is None:
+            return fut.result()
+    if pending:
+        raise DeadlineExceeded("Request deadline exhausted waiting for a timed-out LLM call")
+    return None
+
+
+@metrics.timed("llm")
+def generate(call, prompt: str, deadline: Deadline | None = None) -> str:
+    """Run ``call(prompt, timeout)`` under the request deadline.
+
+    Each attempt gets ``min(call_timeout, remaining budget)``; transient
+    failures are retried with full-jitter exponential backoff, and when
+    hedging is enabled a duplicate call is fired once the attempt has been
+    running longer than the observed p95 latency. Every provider call goes
+    through the shared rate limiter / concurrency governor first; a call that
+    timed out keeps its slot until it returns, and the retry waits for that
+    rather than taking a second one. ``RateLimitTimeout`` is not retried.
+    """
+    deadline = deadline or request_deadline()
+    tokens = estimate_tokens(prompt, EXPECTED_OUTPUT_TOKENS)
+    start = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            # Queue behind the host-wide quota; raises if that outlasts the deadline.
+            governor.acquire(tokens, timeout=deadline.remaining())
+            timeout = min(CALL_TIMEOUT, deadline.remaining())
+            if timeout <= 0:
+                raise DeadlineExceeded("Request deadline exhausted before LLM call")
+            try:
+                return _attempt(call, prompt, timeout, tokens)
+            except RateLimitTimeout:
+                raise
+            except TRANSIENT_ERRORS as e:
+                attempt += 1
+                backoff = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+                if attempt > MAX_RETRIES or backoff >= deadline.remaining():
+                    raise
+                logger.warning("LLM call failed (%s), retry %d in %.2fs", e, attempt, backoff)
+                LLM_RETRIES.inc()
+                time.sleep(backoff)
+                if isinstance(e, AttemptTimeout) and e.pending:
+                    late = _await_stale(e.pending, deadline)
+                    if late is not None:
+                        return late
+    finally:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start)
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to per-process locking
+    fcntl = None
+
+from edjudicate_ai_app.app.core import metrics
+
+LOCK_WAIT_SECONDS = metrics.histogram(
+    "session_lock_wait_seconds", "Time spent waiting for a session read/write lock.", ("mode",))
+
+
+class _ThreadRWLock:
+    """Reader/writer lock for one process; writers are preferred so a steady
+    stream of queries cannot starve a rebuild."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire(self, exclusive, blocking=True):
+        with self._cond:
+            if exclusive:
+                self._waiting_writers += 1
+                try:
+                    while self._writer or self._readers:
+                        if not blocking:
+                            return False
+                        self._cond.wait()
+                    self._writer = True
+                finally:
+                    self._waiting_writers -= 1
+                    if not self._writer:
+                        # Readers held back by this writer may go ahead now
+                        self._cond.notify_all()
+            else:
+                while self._writer or self._waiting_writers:
+                    if not blocking:
+                        return False
+                    self._cond.wait()
+                self._readers += 1
+            return True
+
+    def release(self, exclusive):
+        with self._cond:
+            if exclusive:
+                self._writer = False
+            else:
+                self._readers -= 1
+            self._cond.notify_all()
+
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+class RWFileLock:
+    """Shared/exclusive lock on ``path`` that holds across worker processes.
+
+    Every acquisition opens its own descriptor, so flock also arbitrates
+    between threads of the same process. Without fcntl a per-path in-process
+    lock is used instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _acquire(self, exclusive, blocking):
+        if fcntl is None:
+            with _thread_locks_guard:
+                lock = _thread_locks.setdefault(self.path, _ThreadRWLock())
+            return lock if lock.acquire(exclusive, blocking) else None
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(fd, flags if blocking else flags | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    @staticmethod
+    def _release(handle, exclusive):
+        if isinstance(handle, _ThreadRWLock):
+            handle.release(exclusive)
+        else:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            os.close(handle)
+
+    @contextmanager
+    def _hold(self, exclusive):
+        start = time.perf_counter()
+        handle = self._acquire(exclusive, blocking=True)
+        LOCK_WAIT_SECONDS.labels(mode="write" if exclusive else "read").observe(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._release(handle, exclusive)
+
+    def read(self):
+        return self._hold(exclusive=False)
+
+    def write(self):
+        return self._hold(exclusive=True)
+
+    @contextmanager
+    def try_write(self):
+        """Yields True with the exclusive lock held, or False if it is busy."""
+        handle = self._acquire(exclusive=True, blocking=False)
+        try:
+            yield handle is not None
+        finally:
+            if handle is not None:
+                self._release(handle, exclusive=True)
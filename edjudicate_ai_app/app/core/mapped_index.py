@@ -0,0 +1,107 @@
+import mmap
+import os
+
+import numpy as np
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.quantized import CODES_FILE, binarize, two_stage_search
+
+MAPPED_BYTES = metrics.gauge("mapped_index_bytes", "Bytes of session indexes currently mapped by this worker.")
+
+VECTORS_FILE = "vectors.npy"
+OFFSETS_FILE = "chunk_offsets.npy"
+BLOB_FILE = "chunks.bin"
+
+# Binary-code candidate search plus exact re-scoring for large sessions
+TWO_STAGE = bool(get_setting("retrieval", "two_stage", "enabled", default=False))
+TWO_STAGE_CANDIDATES = int(get_setting("retrieval", "two_stage", "candidates", default=500))
+TWO_STAGE_MIN_VECTORS = int(get_setting("retrieval", "two_stage", "min_vectors", default=5000))
+
+
+def mapped_files(directory):
+    return {name: os.path.join(directory, name) for name in (VECTORS_FILE, CODES_FILE, OFFSETS_FILE, BLOB_FILE)}
+
+
+def has_mapped(directory):
+    return os.path.exists(os.path.join(directory, OFFSETS_FILE))
+
+
+def write_mapped(directory, chunks, vectors, suffix):
+    """Write normalised vectors and chunk texts as flat files, each to
+    ``<name><suffix>`` first. Returns (tmp, final) path pairs; the caller
+    renames them into place while holding the session's write lock."""
+    encoded = [chunk.encode("utf-8") for chunk in chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    paths = mapped_files(directory)
+
+    with open(paths[VECTORS_FILE] + suffix, "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype="float32"))
+    with open(paths[CODES_FILE] + suffix, "wb") as f:
+        np.save(f, binarize(vectors))
+    with open(paths[BLOB_FILE] + suffix, "wb") as f:
+        f.write(b"".join(encoded))
+    with open(paths[OFFSETS_FILE] + suffix, "wb") as f:
+        np.save(f, offsets)
+    # Offsets go last: their presence is what marks the set as complete.
+    return [(paths[name] + suffix, paths[name]) for name in (VECTORS_FILE, CODES_FILE, BLOB_FILE, OFFSETS_FILE)]
+
+
+class _Chunks:
+    """Sequence view decoding chunk texts from the mapped blob on access."""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+
+class MappedIndex:
+    """Read-only, memory-mapped session index.
+
+    The files are mapped rather than read, so every worker process serving
+    the session shares one copy in the page cache and opening it costs no
+    copy. ``search`` mirrors ``faiss.Index.search`` for inner product.
+    """
+
+    def __init__(self, directory):
+        paths = mapped_files(directory)
+        self.vectors = np.load(paths[VECTORS_FILE], mmap_mode="r")
+        self.offsets = np.load(paths[OFFSETS_FILE], mmap_mode="r")
+        # Sessions written before codes were added only support exact search
+        self.codes = np.load(paths[CODES_FILE], mmap_mode="r") if os.path.exists(paths[CODES_FILE]) else None
+        with open(paths[BLOB_FILE], "rb") as f:
+            # mmap cannot map an empty file; the mapping outlives the descriptor
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self.chunks = _Chunks(self._blob, self.offsets)
+        self.nbytes = self.vectors.nbytes + self.offsets.nbytes + len(self._blob) + (
+            self.codes.nbytes if self.codes is not None else 0)
+        MAPPED_BYTES.inc(self.nbytes)
+
+    @property
+    def ntotal(self):
+        return len(self.vectors)
+
+    def search(self, q_vecs, k):
+        k = min(k, self.ntotal)
+        if k == 0:
+            return (np.zeros((len(q_vecs), 0), dtype="float32"), np.zeros((len(q_vecs), 0), dtype="int64"))
+        if TWO_STAGE and self.codes is not None and self.ntotal >= TWO_STAGE_MIN_VECTORS:
+            return two_stage_search(q_vecs, self.codes, self.vectors, k, TWO_STAGE_CANDIDATES)
+        scores = q_vecs @ self.vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def __del__(self):
+        # The mappings themselves are released with the last reference to them
+        MAPPED_BYTES.inc(-getattr(self, "nbytes", 0))
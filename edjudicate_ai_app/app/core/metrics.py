@@ -0,0 +1,297 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from edjudicate_ai_app.app.core.config import get_setting
+
+# Upper bounds (seconds) shared by every latency histogram.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+METRICS_ENABLED = bool(get_setting("observability", "metrics_enabled", default=True))
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self._value = float(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets, window):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        # Recent raw samples give accurate rolling quantiles; the buckets
+        # give cheap cumulative counts for export.
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+            self._recent.append(value)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def cumulative_counts(self):
+        with self._lock:
+            counts = list(self._counts)
+        total = 0
+        out = []
+        for c in counts:
+            total += c
+            out.append(total)
+        return out
+
+    def quantile(self, q):
+        """Quantile over the most recent samples, or None when empty."""
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        idx = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+        return samples[idx]
+
+    def snapshot(self):
+        return {
+            "count": self._count,
+            "sum": round(self._sum, 6),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self):
+        return list(self._children.items())
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"metric {self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    def snapshot(self):
+        out = {}
+        for key, child in self.children():
+            label = ",".join(f"{n}={v}" for n, v in zip(self.labelnames, key)) or "_"
+            out[label] = child.snapshot()
+        return out
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._unlabelled().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._unlabelled().dec(amount)
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS, window=2048):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self.window)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def quantile(self, q):
+        return self._unlabelled().quantile(q)
+
+
+def _register(cls, name, doc, labelnames, **kwargs):
+    with _REGISTRY_LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = cls(name, doc, labelnames, **kwargs)
+            _REGISTRY[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"metric {name} already registered as {metric.kind}")
+        return metric
+
+
+def counter(name, doc, labelnames=()):
+    return _register(Counter, name, doc, labelnames)
+
+
+def gauge(name, doc, labelnames=()):
+    return _register(Gauge, name, doc, labelnames)
+
+
+def histogram(name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram, name, doc, labelnames, buckets=buckets)
+
+
+def registered():
+    with _REGISTRY_LOCK:
+        return list(_REGISTRY.values())
+
+
+def snapshot():
+    """JSON-friendly view of every registered metric."""
+    return {m.name: m.snapshot() for m in registered()}
+
+
+STAGE_SECONDS = histogram("stage_seconds", "Latency of pipeline stages (download, extract, embed, search, llm, ...).", ("stage",))
+
+# Per-request list of (stage, seconds), installed by the Server-Timing
+# middleware. Thread pools that copy the context share the same list.
+_request_timings = ContextVar("request_timings", default=None)
+
+
+class timed(ContextDecorator):
+    """Time a block or function as a pipeline stage.
+
+    Usable as ``with timed("embed"):`` or ``@timed("embed")``. The duration
+    goes to ``stage_seconds`` and to the current request's Server-Timing
+    header; with metrics disabled and no request collecting timings it costs
+    a couple of clock reads.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._start = None
+
+    def _recreate_cm(self):
+        # Decorated functions may run concurrently; give each call its own timer.
+        return timed(self.stage)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        if METRICS_ENABLED:
+            STAGE_SECONDS.labels(stage=self.stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def start_request_timings():
+    """Begin collecting stage timings for the current request; returns the
+    list plus a token for ``end_request_timings``."""
+    timings = []
+    return timings, _request_timings.set(timings)
+
+
+def end_request_timings(token):
+    _request_timings.reset(token)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in registered():
+        lines.append(f"# HELP {metric.name} {metric.doc}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, child in metric.children():
+            if metric.kind == "histogram":
+                bounds = list(metric.buckets) + [float("inf")]
+                for bound, count in zip(bounds, child.cumulative_counts()):
+                    labels = _format_labels(metric.labelnames, key, (("le", _format_value(bound)),))
+                    lines.append(f"{metric.name}_bucket{labels} {count}")
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(child.sum)}")
+                lines.append(f"{metric.name}_count{labels} {child.count}")
+            else:
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(child.value)}")
+    return "\n".join(lines) + "\n"
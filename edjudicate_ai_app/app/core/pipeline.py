@@ -0,0 +1,102 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.embedder import embed_texts
+from edjudicate_ai_app.app.core.engine import answer_from_chunks
+from edjudicate_ai_app.app.core.metrics import timed
+from edjudicate_ai_app.app.core.retriever import build_index_from_vectors
+from edjudicate_ai_app.app.core import section_index
+from edjudicate_ai_app.app.ingestion import dedup
+from edjudicate_ai_app.app.ingestion.chunk import iter_chunks, iter_section_chunks
+from edjudicate_ai_app.app.ingestion.load import iter_pdf_pages
+from edjudicate_ai_app.app.ingestion.sections import iter_pdf_sections
+
+EMBED_BATCH = int(get_setting("performance", "pipeline", "embed_batch", default=64))
+NOT_FOUND = "Information not found in the provided document."
+
+_pool = ThreadPoolExecutor(
+    max_workers=int(get_setting("performance", "pipeline", "workers", default=8)),
+    thread_name_prefix="pipeline",
+)
+
+
+def submit(fn, *args, **kwargs):
+    """Run `fn` on the shared pipeline pool, keeping the caller's context
+    (stage timings, profiling flags) visible to it."""
+    ctx = contextvars.copy_context()
+    return _pool.submit(ctx.run, fn, *args, **kwargs)
+
+
+def embed_async(texts):
+    return submit(embed_texts, list(texts))
+
+
+def _embed_timed(texts):
+    start = time.perf_counter()
+    vectors = embed_texts(texts)
+    return vectors, time.perf_counter() - start
+
+
+def index_pdf_bytes(data: bytes, session_id: str) -> int:
+    """Extract, chunk, embed and index a PDF as overlapping stages.
+
+    Pages are chunked as they are extracted and every `EMBED_BATCH` chunks
+    are sent to the pool for embedding, so the model works while extraction
+    continues. Running headers/footers and near-duplicate chunks are dropped
+    first when enabled. With hierarchical retrieval, chunks are cut within
+    the sections found from the PDF's headings. Raises ValueError if `data`
+    is not a PDF or has no text. Returns the number of chunks indexed.
+    """
+    if section_index.ENABLED:
+        pieces = iter_section_chunks(iter_pdf_sections(data, strip=dedup.STRIP))
+    else:
+        pages = iter_pdf_pages(data)
+        if dedup.STRIP:
+            pages = dedup.strip_boilerplate(pages)
+        pieces = ((0, "", chunk) for chunk in iter_chunks(pages))
+    duplicates = dedup.Deduplicator() if dedup.DEDUP else None
+    chunks, chunk_sections, titles, futures, batch = [], [], {}, [], []
+    with timed("extract"):
+        for position, (section, title, chunk) in enumerate(pieces):
+            titles[section] = title
+            if duplicates is not None and duplicates.add(chunk, position) < len(chunks):
+                continue
+            chunks.append(chunk)
+            chunk_sections.append(section)
+            batch.append(chunk)
+            if len(batch) >= EMBED_BATCH:
+                futures.append(submit(_embed_timed, batch))
+                batch = []
+    if batch:
+        futures.append(submit(_embed_timed, batch))
+    if not chunks:
+        raise ValueError("Document contains no extractable text")
+    results = [f.result() for f in futures]
+    vectors = np.vstack([np.asarray(v, dtype="float32") for v, _ in results])
+    provenance = None
+    if duplicates is not None:
+        duplicates.report(sum(seconds for _, seconds in results))
+        provenance = duplicates.provenance()
+    sections = None
+    if section_index.ENABLED:
+        sections = ([titles.get(n, "") for n in range(max(titles) + 1)], chunk_sections, None)
+    build_index_from_vectors(chunks, vectors, session_id, provenance, sections)
+    return len(chunks)
+
+
+def _answer_or_default(question, clauses, deadline):
+    try:
+        return answer_from_chunks(question, clauses, deadline=deadline)
+    except Exception:
+        return NOT_FOUND
+
+
+def answer_all(questions, clause_lists, deadline=None):
+    """Answer every question concurrently; results come back in input order,
+    with a per-question fallback instead of failing the whole batch."""
+    futures = [submit(_answer_or_default, q, clauses, deadline) for q, clauses in zip(questions, clause_lists)]
+    return [f.result() for f in futures]
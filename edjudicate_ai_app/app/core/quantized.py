@@ -0,0 +1,38 @@
+import numpy as np
+
+CODES_FILE = "codes.npy"
+
+
+def binarize(vectors):
+    """Sign-bit codes packed into uint64 words (dim/64 words per vector,
+    32x smaller than float32)."""
+    bits = np.packbits(np.asarray(vectors) > 0, axis=1)
+    pad = -bits.shape[1] % 8
+    if pad:
+        bits = np.pad(bits, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(bits).view("<u8")
+
+
+def hamming(codes, q_code):
+    """Hamming distance from one packed query code to every row of ``codes``."""
+    return np.bitwise_count(np.bitwise_xor(codes, q_code)).sum(axis=1, dtype="int32")
+
+
+def two_stage_search(q_vecs, codes, vectors, k, candidates):
+    """Coarse Hamming search over binary codes, then exact inner products on
+    the surviving candidates only. Same (scores, ids) shape as faiss search."""
+    n = len(codes)
+    k = min(k, n)
+    candidates = min(max(candidates, k), n)
+    q_codes = binarize(q_vecs)
+    D = np.empty((len(q_vecs), k), dtype="float32")
+    I = np.empty((len(q_vecs), k), dtype="int64")
+    for row, (q, q_code) in enumerate(zip(q_vecs, q_codes)):
+        distances = hamming(codes, q_code)
+        cand = np.argpartition(distances, candidates - 1)[:candidates] if candidates < n else np.arange(n)
+        cand.sort()   # ascending ids read the mapped vectors sequentially
+        exact = vectors[cand] @ q
+        top = np.argpartition(-exact, k - 1)[:k]
+        top = top[np.argsort(-exact[top])]
+        D[row], I[row] = exact[top], cand[top]
+    return D, I
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.embedder import embed_texts
+from edjudicate_ai_app.app.core.metrics import timed
+from edjudicate_ai_app.app.core.pipeline import NOT_FOUND, answer_all
+from edjudicate_ai_app.app.core.retriever import search_chunks
+from edjudicate_ai_app.app.core.sessions import backup_dir
+
+logger = logging.getLogger(__name__)
+
+ENABLED = bool(get_setting("question_bank", "enabled", default=False))
+QUESTIONS = list(get_setting("question_bank", "questions", default=[]) or [])
+MATCH_THRESHOLD = float(get_setting("question_bank", "match_threshold", default=0.9))
+K = int(get_setting("question_bank", "k", default=5))
+ANSWERS_FILE = "standard_answers.json"
+
+BANK_LOOKUPS = metrics.counter("question_bank_total", "Questions answered from the precomputed bank (hit) or not (miss).",
+                               ("result",))
+
+_vectors = None
+_vectors_lock = threading.Lock()
+# Precompute waits on answer_all's pipeline tasks, so it must not run on the
+# pipeline pool itself; one session at a time also keeps it off the LLM quota's back
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+
+
+def _bank_vectors():
+    """Normalised embeddings of the bank questions, computed once per process."""
+    global _vectors
+    if _vectors is None:
+        with _vectors_lock:
+            if _vectors is None:
+                vectors = np.asarray(embed_texts(QUESTIONS), dtype="float32").reshape(len(QUESTIONS), -1)
+                _vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return _vectors
+
+
+def _path(session_id):
+    return os.path.join(backup_dir(session_id), ANSWERS_FILE)
+
+
+@timed("question_bank")
+def precompute(session_id, deadline=None):
+    """Answer every bank question against the session and store the results
+    next to its index."""
+    if not QUESTIONS:
+        return 0
+    hits = search_chunks(_bank_vectors(), session_id, k=K, queries=QUESTIONS)
+    answers = answer_all(QUESTIONS, [[chunk for chunk, _ in h] for h in hits], deadline=deadline)
+    path = _path(session_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({q: a for q, a in zip(QUESTIONS, answers)}, f)
+    os.replace(tmp, path)
+    logger.info("Precomputed %d standard answers for session %s", len(answers), session_id)
+    return len(answers)
+
+
+def _precompute_logged(session_id):
+    try:
+        precompute(session_id)
+    except Exception:
+        logger.exception("Precomputing standard answers for session %s failed", session_id)
+
+
+def schedule(session_id):
+    """Run `precompute` in the background after a session is (re)indexed,
+    if the bank is enabled."""
+    if ENABLED and QUESTIONS:
+        _background.submit(_precompute_logged, session_id)
+
+
+@lru_cache(maxsize=128)
+def _load(path, stamp):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _stored(session_id):
+    path = _path(session_id)
+    try:
+        return _load(path, os.stat(path).st_mtime_ns)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def lookup(session_id, question_vectors):
+    """Stored answers for questions matching a bank entry: one answer or
+    None per question. Stored NOT_FOUND answers (which include LLM
+    failures during precompute) are not served, so those questions get a
+    fresh attempt."""
+    if not ENABLED or not QUESTIONS or not len(question_vectors):
+        return [None] * len(question_vectors)
+    stored = _stored(session_id)
+    if not stored:
+        return [None] * len(question_vectors)
+    q = np.asarray(question_vectors, dtype="float32")
+    q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+    similarity = q @ _bank_vectors().T
+    best = similarity.argmax(axis=1)
+    answers = []
+    for row, match in enumerate(best):
+        answer = stored.get(QUESTIONS[match]) if similarity[row, match] >= MATCH_THRESHOLD else None
+        if answer == NOT_FOUND:
+            answer = None
+        BANK_LOOKUPS.labels(result="hit" if answer is not None else "miss").inc()
+        answers.append(answer)
+    return answers
@@ -0,0 +1,191 @@
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to per-process limiting
+    fcntl = None
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+
+RATE_LIMIT_WAIT_SECONDS = metrics.histogram(
+    "llm_ratelimit_wait_seconds", "Time LLM calls spent queued behind the shared rate limiter.")
+CONCURRENCY_WAIT_SECONDS = metrics.histogram(
+    "llm_concurrency_wait_seconds", "Time LLM calls waited for a shared concurrency slot.")
+RATE_LIMIT_REJECTED = metrics.counter(
+    "llm_ratelimit_rejected_total", "LLM calls that could not be scheduled within their deadline.", ("reason",))
+
+# Two float64 "theoretical arrival times": one for requests, one for tokens.
+_STATE = struct.Struct("<dd")
+
+
+class RateLimitTimeout(TimeoutError):
+    """The call could not be scheduled before its deadline."""
+
+
+def estimate_tokens(prompt: str, expected_output: int = 0) -> int:
+    """Cheap prompt size estimate (~4 chars per token) used for quota accounting."""
+    return len(prompt) // 4 + expected_output
+
+
+class _SharedFile:
+    """A small file guarded by flock, opened lazily per process so forked
+    workers never share an open file description (which would defeat flock)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+        self._thread_lock = threading.Lock()
+
+    def _fileno(self):
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    @contextmanager
+    def locked(self):
+        with self._thread_lock:
+            fd = self._fileno()
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield fd
+            finally:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class LLMGovernor:
+    """Token-bucket rate limiter and concurrency cap shared by every worker
+    process on the host.
+
+    Rate limiting uses GCRA: each caller atomically reserves the next free
+    slot in the shared schedule and then sleeps until it comes up, so waiters
+    are served in arrival order and nobody polls. Concurrency slots are
+    ``max_concurrent`` lock files; the kernel releases a slot if its holder dies.
+    """
+
+    def __init__(self, state_dir, requests_per_minute=0, tokens_per_minute=0,
+                 burst_seconds=5.0, max_concurrent=0):
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_dir = state_dir
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+        self.max_concurrent = max_concurrent
+        self._state = _SharedFile(os.path.join(state_dir, "buckets.state"))
+        self._local_slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent and not fcntl else None
+
+    @staticmethod
+    def _interval(per_minute):
+        return 60.0 / per_minute if per_minute else 0.0
+
+    def _reserve(self, tokens, max_wait):
+        """Reserve capacity for one call; returns how long to wait for it or
+        raises without reserving if that exceeds ``max_wait``."""
+        req_t = self._interval(self.requests_per_minute)
+        tok_t = self._interval(self.tokens_per_minute)
+        if not req_t and not tok_t:
+            return 0.0
+        # Never let one oversized prompt demand more than a full bucket.
+        if tok_t:
+            tokens = min(tokens, self.tokens_per_minute * self.burst_seconds / 60.0)
+        with self._state.locked() as fd:
+            raw = os.pread(fd, _STATE.size, 0)
+            req_tat, tok_tat = _STATE.unpack(raw) if len(raw) == _STATE.size else (0.0, 0.0)
+            now = time.time()
+            new_req = max(req_tat, now) + req_t
+            new_tok = max(tok_tat, now) + tokens * tok_t
+            # Up to `burst_seconds` worth of quota may be spent ahead of schedule.
+            wait = max(
+                new_req - self.burst_seconds - now if req_t else 0.0,
+                new_tok - self.burst_seconds - now if tok_t else 0.0,
+                0.0,
+            )
+            if wait > max_wait:
+                raise RateLimitTimeout(f"LLM rate limit would delay call by {wait:.1f}s")
+            os.pwrite(fd, _STATE.pack(new_req if req_t else req_tat, new_tok if tok_t else tok_tat), 0)
+        return wait
+
+    def acquire(self, tokens: int, timeout: float) -> float:
+        """Block until the shared quota admits a call of ``tokens`` tokens."""
+        try:
+            wait = self._reserve(tokens, timeout)
+        except RateLimitTimeout:
+            RATE_LIMIT_REJECTED.labels(reason="rate").inc()
+            raise
+        if wait > 0:
+            time.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(wait)
+        return wait
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Take quota only if it is available right now (used for hedges)."""
+        try:
+            return self._reserve(tokens, 0.0) == 0.0
+        except RateLimitTimeout:
+            return False
+
+    def _try_slot(self):
+        if self._local_slots is not None:
+            return self._local_slots if self._local_slots.acquire(blocking=False) else None
+        order = list(range(self.max_concurrent))
+        random.shuffle(order)
+        for i in order:
+            fd = os.open(os.path.join(self.state_dir, f"slot-{i}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def _release_slot(self, handle):
+        if handle is self._local_slots:
+            handle.release()
+        else:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            os.close(handle)
+
+    @contextmanager
+    def slot(self, timeout: float, blocking: bool = True):
+        """Hold one of the host-wide LLM concurrency slots for the duration."""
+        if not self.max_concurrent:
+            yield
+            return
+        start = time.monotonic()
+        handle = self._try_slot()
+        while handle is None:
+            if not blocking or time.monotonic() - start >= timeout:
+                RATE_LIMIT_REJECTED.labels(reason="concurrency").inc()
+                raise RateLimitTimeout("No LLM concurrency slot available")
+            time.sleep(random.uniform(0.005, 0.025))
+            handle = self._try_slot()
+        CONCURRENCY_WAIT_SECONDS.observe(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self._release_slot(handle)
+
+
+def _governor_from_config():
+    rl = get_setting("performance", "llm", "rate_limit", default={}) or {}
+    state_dir = rl.get("state_dir") or os.path.join(tempfile.gettempdir(), "edjudicate_llm_governor")
+    return LLMGovernor(
+        state_dir,
+        requests_per_minute=float(rl.get("requests_per_minute", 0) or 0),
+        tokens_per_minute=float(rl.get("tokens_per_minute", 0) or 0),
+        burst_seconds=float(rl.get("burst_seconds", 5.0)),
+        max_concurrent=int(rl.get("max_concurrent", 0) or 0),
+    )
+
+
+governor = _governor_from_config()
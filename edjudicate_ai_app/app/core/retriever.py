@@ -1,17 +1,62 @@
+import json
+import logging
 import os
+import time
 import numpy as np
 import faiss
 import pickle
 import yaml
+from edjudicate_ai_app.app.core.config import get_setting
 from edjudicate_ai_app.app.core.embedder import embed_texts
+from edjudicate_ai_app.app.core import lexical
+from edjudicate_ai_app.app.core.mapped_index import (
+    OFFSETS_FILE, MappedIndex, has_mapped, mapped_files, write_mapped,
+)
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.metrics import timed
+from edjudicate_ai_app.app.core import section_index
+from edjudicate_ai_app.app.core.section_index import SECTIONS_FILE, SectionIndex, load_sections
+from edjudicate_ai_app.app.core.sessions import backup_dir, registry, session_lock
+from edjudicate_ai_app.app.core.vector_store import store_from_config
+from edjudicate_ai_app.app.ingestion import dedup
 from datetime import datetime
 
 
 with open("config/config.yaml") as f:
     cfg = yaml.safe_load(f)
 
+logger = logging.getLogger(__name__)
+
+# Optional consolidated store (vector_db.store: shared); None keeps one index file per session
+STORE = store_from_config()
+if STORE is not None:
+    registry.on_delete(STORE.remove)
+
+# Write per-session indexes as flat files served via mmap, so all workers share
+# one page-cache copy. Sessions written as faiss.index + chunks.pkl still load.
+MMAP = bool(get_setting("vector_db", "mmap", default=True))
+
+# retrieval.mode: "dense" (embeddings only) or "hybrid" (dense fused with BM25)
+MODE = get_setting("retrieval", "mode", default="dense")
+FUSION = get_setting("retrieval", "hybrid", "fusion", default="rrf")
+RRF_K = int(get_setting("retrieval", "hybrid", "rrf_k", default=60))
+DENSE_WEIGHT = float(get_setting("retrieval", "hybrid", "dense_weight", default=0.5))
+CANDIDATES = int(get_setting("retrieval", "hybrid", "candidates", default=30))
+
+# Adaptive top-k: the k passed by callers becomes the upper bound
+ADAPTIVE = bool(get_setting("retrieval", "adaptive", "enabled", default=False))
+MIN_K = int(get_setting("retrieval", "adaptive", "min_k", default=1))
+MAX_K = int(get_setting("retrieval", "adaptive", "max_k", default=5))
+RELATIVE_THRESHOLD = float(get_setting("retrieval", "adaptive", "relative_threshold", default=0.8))
+GAP_RATIO = float(get_setting("retrieval", "adaptive", "gap_ratio", default=0.15))
+
+# Which original chunks each indexed chunk stands for, when near-duplicates were removed
+PROVENANCE_FILE = "provenance.json"
+
+CHOSEN_K = metrics.histogram("retrieval_chosen_k", "Chunks returned per query.", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20))
+
 def get_paths(session_id):
-    base_dir = os.path.join("data", f"session_{session_id}", "backup")
+    base_dir = backup_dir(session_id)
     return {
         "INDEX_PATH": os.path.join(base_dir, "faiss.index"),
         "META_PATH": os.path.join(base_dir, "chunks.pkl")
@@ -22,47 +67,250 @@ def normalize_embeddings(vectors):
     norms = np.linalg.norm(vectors, axis=1, keepdims=True)
     return vectors / norms
 
-def build_index(text_chunks,session_id,force_rebuild):
+def build_index(text_chunks,session_id,force_rebuild,sources=None,sections=None):
     paths = get_paths(session_id)
     INDEX_PATH = paths["INDEX_PATH"]
     META_PATH = paths["META_PATH"]
     os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
 
-    if os.path.exists(INDEX_PATH) and os.path.exists(META_PATH) and not force_rebuild:
+    built = (os.path.exists(INDEX_PATH) and os.path.exists(META_PATH)) or has_mapped(os.path.dirname(INDEX_PATH))
+    if built and not force_rebuild:
         print("Index already exists.")
         return
 
     print("Building FAISS index...")
 
+    kept = dedup.dedupe(text_chunks, sources) if dedup.DEDUP else None
+    if kept is not None:
+        text_chunks = kept.kept
+        if sections is not None:
+            # A kept chunk stays in the section of its first occurrence
+            titles, chunk_sections, documents = sections
+            first = {}
+            for original, position in enumerate(kept.mapping):
+                first.setdefault(position, original)
+            sections = (titles, [chunk_sections[first[p]] for p in range(len(text_chunks))], documents)
+    start = time.perf_counter()
     vectors = embed_texts(text_chunks)
+    if kept is not None:
+        kept.report(time.perf_counter() - start)
+        provenance = kept.provenance()
+    elif sources is not None:
+        provenance = {"original_chunks": len(sources), "sources": [[source] for source in sources]}
+    else:
+        provenance = None
+    build_index_from_vectors(text_chunks, vectors, session_id, provenance, sections)
+
+def build_index_from_vectors(text_chunks, vectors, session_id, provenance=None, sections=None):
+    """Write the index for chunks whose embeddings were already computed
+    (e.g. in batches while the document was still being extracted).
+    `provenance` (from the near-duplicate filter) is stored alongside, and
+    `sections` — (titles, section number per chunk, document number per
+    section or None) — becomes the section index for coarse-to-fine search."""
+    paths = get_paths(session_id)
+    INDEX_PATH = paths["INDEX_PATH"]
+    META_PATH = paths["META_PATH"]
+    os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+
     vectors = normalize_embeddings(np.array(vectors).astype("float32"))
 
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatIP(dim) 
+    # The BM25 index sits next to the vectors in every storage mode
+    suffix = f".{os.getpid()}.tmp"
+    base_dir = os.path.dirname(INDEX_PATH)
+    bm25_path = os.path.join(base_dir, lexical.BM25_FILE)
+    lexical.BM25Index.build(text_chunks).save(bm25_path + suffix)
+    provenance_path = os.path.join(base_dir, PROVENANCE_FILE)
+    if provenance is not None:
+        with open(provenance_path + suffix, "w") as f:
+            json.dump(provenance, f)
+    sections_path = os.path.join(base_dir, SECTIONS_FILE)
+    if sections is not None:
+        titles, chunk_sections, documents = sections
+        SectionIndex.build(chunk_sections, vectors, titles, documents).save(sections_path + suffix)
 
-    index.add(vectors)
+    if STORE is not None:
+        with timed("index_write"):
+            STORE.add(session_id, text_chunks, vectors)
+            with session_lock(session_id).write():
+                os.replace(bm25_path + suffix, bm25_path)
+                _replace_optional(provenance_path, suffix, provenance is not None)
+                _replace_optional(sections_path, suffix, sections is not None)
+        registry.register(session_id)
+        print("Vectors added to shared store.")
+        return
 
-    faiss.write_index(index, INDEX_PATH)
-    with open(META_PATH, "wb") as f:
-        pickle.dump(text_chunks, f)
+    # Write to temp files and rename, under the session's write lock, so
+    # readers never see a half-written or mismatched index/chunks pair.
+    with timed("index_write"):
+        if MMAP:
+            renames = write_mapped(base_dir, text_chunks, vectors, suffix)
+            stale = [INDEX_PATH, META_PATH]
+        else:
+            dim = vectors.shape[1]
+            index = faiss.IndexFlatIP(dim)
+            index.add(vectors)
+            faiss.write_index(index, INDEX_PATH + suffix)
+            with open(META_PATH + suffix, "wb") as f:
+                pickle.dump(text_chunks, f)
+            renames = [(INDEX_PATH + suffix, INDEX_PATH), (META_PATH + suffix, META_PATH)]
+            stale = list(mapped_files(base_dir).values())
+        # Before the chunks/offsets file, whose mtime marks the build as current
+        renames.insert(0, (bm25_path + suffix, bm25_path))
+        with session_lock(session_id).write():
+            for path in stale:
+                # A rebuild in the other format must not leave the old one behind
+                if os.path.exists(path):
+                    os.remove(path)
+            _replace_optional(provenance_path, suffix, provenance is not None)
+            _replace_optional(sections_path, suffix, sections is not None)
+            for tmp, final in renames:
+                os.replace(tmp, final)
+            registry.register(session_id)
 
     print("FAISS index saved.")
 
+def _replace_optional(path, suffix, written):
+    if written:
+        os.replace(path + suffix, path)
+    elif os.path.exists(path):
+        # Left over from an earlier build of the session
+        os.remove(path)
+
+def index_exists(session_id):
+    return registry.has_session(session_id)
+
+def _stamp(paths):
+    # The file written last identifies the current build of a session
+    for path in (os.path.join(os.path.dirname(paths["META_PATH"]), OFFSETS_FILE), paths["META_PATH"]):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return None
+
+@timed("index_load")
 def load_index(session_id):
     paths = get_paths(session_id)
     INDEX_PATH = paths["INDEX_PATH"]
     META_PATH = paths["META_PATH"]
 
-    if not os.path.exists(INDEX_PATH):
+    # A cached copy is reused only while the chunks file it was read from is
+    # still current (another worker may have rebuilt or evicted the session).
+    loaded = registry.get_loaded(session_id)
+    if loaded is not None and loaded[0] == _stamp(paths):
+        return loaded[1], loaded[2]
+
+    try:
+        with session_lock(session_id).read():
+            stamp = _stamp(paths)
+            if has_mapped(os.path.dirname(INDEX_PATH)):
+                index = MappedIndex(os.path.dirname(INDEX_PATH))
+                chunks = index.chunks
+            else:
+                index = faiss.read_index(INDEX_PATH)
+                with open(META_PATH, "rb") as f:
+                    chunks = pickle.load(f)
+    except (FileNotFoundError, RuntimeError):
+        # faiss raises RuntimeError for a missing file; the session may have been evicted
+        registry.forget(session_id)
         raise FileNotFoundError("FAISS index not found.")
-    index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "rb") as f:
-        chunks = pickle.load(f)
+    registry.put_loaded(session_id, (stamp, index, chunks))
     return index, chunks
 
-def retrieve_chunks(query,session_id, k=5):
+def _dense_search(session_id, q_vecs, k):
+    """Returns (scores, chunk ids, chunks); ids are -1 where fewer than k hits."""
+    if STORE is not None:
+        with timed("search"):
+            found = STORE.search(session_id, q_vecs, k)
+        if found is None:
+            raise FileNotFoundError("FAISS index not found.")
+        registry.touch(session_id)
+        return found
+
     index, chunks = load_index(session_id)
-    q_vec = embed_texts([query])
-    q_vec = normalize_embeddings(np.array(q_vec).astype("float32"))
-    _, I = index.search(q_vec, k)
-    return [chunks[i] for i in I[0]]
+    sections = load_sections(backup_dir(session_id)) if section_index.ENABLED else None
+    with timed("search"):
+        if sections is not None and sections.nchunks == index.ntotal >= section_index.MIN_CHUNKS:
+            D, I = sections.search(q_vecs, _index_vectors(index), k)
+        else:
+            D, I = index.search(q_vecs, k)
+    return D, I, chunks
+
+def _index_vectors(index):
+    """The stored vectors of a session index as an array, without copying."""
+    if isinstance(index, MappedIndex):
+        return index.vectors
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+def _search(session_id, q_vecs, k, queries=None):
+    """Top-k search within one session for normalised query vectors and,
+    in hybrid mode, their texts. Returns (scores, chunk ids, chunks) with
+    one score/id array per query."""
+    bm25 = lexical.load_bm25(backup_dir(session_id)) if MODE == "hybrid" and queries else None
+    D, I, chunks = _dense_search(session_id, q_vecs, max(k, CANDIDATES) if bm25 else k)
+    dense = [(d[i >= 0], i[i >= 0]) for d, i in zip(D, I)]
+    if bm25 is None:
+        return [d for d, _ in dense], [i for _, i in dense], chunks
+
+    scores, ids = [], []
+    for query, (d, i) in zip(queries, dense):
+        lex = bm25.search(query, max(k, CANDIDATES))
+        if FUSION == "weighted":
+            s, top = lexical.weighted((d, i), lex, k, DENSE_WEIGHT)
+        else:
+            s, top = lexical.rrf([i, lex[1]], k, RRF_K)
+        scores.append(s)
+        ids.append(top)
+    return scores, ids, chunks
+
+def choose_k(scores, min_k=MIN_K, max_k=MAX_K, relative=RELATIVE_THRESHOLD, gap_ratio=GAP_RATIO):
+    """How many of the descending ``scores`` to keep.
+
+    Keeps results scoring at least ``relative`` x the best one, then cuts
+    earlier at the largest drop between neighbours if that drop is at least
+    ``gap_ratio`` x the best score. Both tests are relative to the top score
+    so they work for cosine, RRF and blended scores alike.
+    """
+    n = min(len(scores), max_k)
+    top = float(scores[0]) if n else 0.0
+    if n <= min_k or top <= 0:
+        return n
+    s = np.asarray(scores[:n], dtype="float32")
+    keep = max(min_k, int(np.count_nonzero(s >= top * relative)))
+    gaps = s[min_k - 1:keep - 1] - s[min_k:keep]
+    if len(gaps) and gaps.max() >= top * gap_ratio:
+        keep = min_k + int(gaps.argmax())
+    return keep
+
+def search_hits(q_vecs, session_id, k=5, queries=None):
+    """Scored retrieval for pre-embedded queries: one list of (chunk id,
+    chunk, score) triples per query, best first. With retrieval.adaptive
+    enabled, ``k`` is the upper bound and each query keeps only the chunks
+    above its cut-off."""
+    q_vecs = normalize_embeddings(np.array(q_vecs).astype("float32"))
+    scores, ids, chunks = _search(session_id, q_vecs, k, queries)
+    results = []
+    for n, (s, row) in enumerate(zip(scores, ids)):
+        keep = choose_k(s, max_k=min(k, MAX_K)) if ADAPTIVE else len(row)
+        CHOSEN_K.observe(keep)
+        if ADAPTIVE:
+            logger.info("Retrieval kept k=%d of %d for %r (scores %s)", keep, len(row),
+                        (queries[n] if queries else f"query {n}")[:80], [round(float(x), 3) for x in s])
+        results.append([(int(i), chunks[i], float(score)) for i, score in zip(row[:keep], s[:keep])])
+    return results
+
+def search_chunks(q_vecs, session_id, k=5, queries=None):
+    """`search_hits` without chunk ids: lists of (chunk, score) pairs."""
+    return [[(chunk, score) for _, chunk, score in hits] for hits in search_hits(q_vecs, session_id, k, queries)]
+
+def retrieve_scored_chunks(query, session_id, k=5):
+    return search_chunks(embed_texts([query]), session_id, k, [query])[0]
+
+def retrieve_chunks(query,session_id, k=5):
+    return [chunk for chunk, _ in retrieve_scored_chunks(query, session_id, k)]
+
+def retrieve_chunks_for_vectors(q_vecs, session_id, k=5, queries=None):
+    """Search many pre-embedded queries against one session with a single
+    index load and one matrix search. Returns one chunk list per query.
+    Pass the query texts as well to use hybrid retrieval."""
+    return [[chunk for chunk, _ in hits] for hits in search_chunks(q_vecs, session_id, k, queries)]
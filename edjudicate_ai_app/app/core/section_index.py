@@ -0,0 +1,112 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+
+SECTIONS_FILE = "sections.npz"
+
+# Coarse-to-fine search: pick sections by centroid, then score only their chunks
+ENABLED = bool(get_setting("retrieval", "hierarchical", "enabled", default=False))
+TOP_SECTIONS = int(get_setting("retrieval", "hierarchical", "top_sections", default=8))
+MIN_CHUNKS = int(get_setting("retrieval", "hierarchical", "min_chunks", default=2000))
+
+CANDIDATES = metrics.histogram("hierarchical_candidates", "Chunks scored per query after section selection.",
+                               buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+
+
+class SectionIndex:
+    """Section centroids over a session's chunks.
+
+    ``vectors`` holds one normalised centroid per section; the chunk ids of
+    section ``s`` are ``order[offsets[s]:offsets[s + 1]]``. ``documents``
+    gives the document number of each section and ``titles`` its heading.
+    """
+
+    def __init__(self, vectors, order, offsets, titles, documents):
+        self.vectors = vectors
+        self.order = order
+        self.offsets = offsets
+        self.titles = titles
+        self.documents = documents
+        self._chunk_sections = None
+
+    @classmethod
+    def build(cls, chunk_sections, chunk_vectors, titles, documents=None):
+        """Centroids from normalised chunk vectors; ``chunk_sections`` is the
+        section number of every chunk."""
+        chunk_sections = np.asarray(chunk_sections, dtype="int64")
+        n = len(titles)
+        order = np.argsort(chunk_sections, kind="stable")
+        offsets = np.zeros(n + 1, dtype="int64")
+        np.cumsum(np.bincount(chunk_sections, minlength=n), out=offsets[1:])
+        sums = np.zeros((n, chunk_vectors.shape[1]), dtype="float32")
+        np.add.at(sums, chunk_sections, chunk_vectors)
+        # Sections whose chunks were all removed as duplicates keep a zero centroid
+        vectors = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        documents = np.zeros(n, dtype="int32") if documents is None else np.asarray(documents, dtype="int32")
+        return cls(vectors, order, offsets, list(titles), documents)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, vectors=self.vectors, order=self.order, offsets=self.offsets,
+                     titles=np.array(self.titles, dtype=str), documents=self.documents)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["vectors"], data["order"], data["offsets"], data["titles"].tolist(), data["documents"])
+
+    @property
+    def nchunks(self):
+        return int(self.offsets[-1])
+
+    def section_of(self, chunk_id):
+        """Section number holding ``chunk_id``."""
+        if self._chunk_sections is None:
+            inverse = np.empty(self.nchunks, dtype="int64")
+            inverse[self.order] = np.repeat(np.arange(len(self.titles)), np.diff(self.offsets))
+            self._chunk_sections = inverse
+        return int(self._chunk_sections[chunk_id])
+
+    def search(self, q_vecs, chunk_vectors, k, top_sections=TOP_SECTIONS):
+        """Score the ``top_sections`` best sections' chunks exactly for each
+        query. Mirrors ``faiss.Index.search``: (scores, ids), ids -1 where a
+        query's sections hold fewer than k chunks."""
+        D = np.full((len(q_vecs), k), -np.inf, dtype="float32")
+        I = np.full((len(q_vecs), k), -1, dtype="int64")
+        if not len(self.titles) or k == 0:
+            return D, I
+        top = min(top_sections, len(self.titles))
+        section_scores = q_vecs @ self.vectors.T
+        best = np.argpartition(-section_scores, top - 1, axis=1)[:, :top]
+        for n, (q, sections) in enumerate(zip(q_vecs, best)):
+            ids = np.concatenate([self.order[self.offsets[s]:self.offsets[s + 1]] for s in sections])
+            CANDIDATES.observe(len(ids))
+            if not len(ids):
+                continue
+            # Fancy indexing reads only the candidate rows of a mapped array
+            ids = np.sort(ids)
+            scores = chunk_vectors[ids] @ q
+            kk = min(k, len(ids))
+            part = np.argpartition(-scores, kk - 1)[:kk]
+            part = part[np.argsort(-scores[part])]
+            D[n, :kk], I[n, :kk] = scores[part], ids[part]
+        return D, I
+
+
+@lru_cache(maxsize=64)
+def _load(path, stamp):
+    return SectionIndex.load(path)
+
+
+def load_sections(directory):
+    """The session's section index, or None for sessions built without one."""
+    path = os.path.join(directory, SECTIONS_FILE)
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load(path, stamp)
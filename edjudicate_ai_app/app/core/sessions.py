@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+import secrets
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.locks import RWFileLock
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = get_setting("storage", "data_directory", default="data")
+UPLOADS_DIR = get_setting("storage", "temp_uploads_directory", default="temp_uploads")
+SESSION_PREFIX = get_setting("storage", "session_prefix", default="session_")
+BACKUP_DIR = get_setting("storage", "backup_directory", default="backup")
+
+# Touching a session rewrites its directory mtime at most this often, which is
+# how other workers (and restarts) learn about recent access.
+_TOUCH_PERSIST_SECONDS = 60
+
+SESSIONS_ACTIVE = metrics.gauge("sessions_active", "Sessions with an index on disk.")
+SESSION_DISK_BYTES = metrics.gauge("session_disk_bytes", "Bytes used by session indexes and uploads.")
+SESSIONS_EVICTED = metrics.counter("sessions_evicted_total", "Sessions deleted by the lifecycle manager.", ("reason",))
+RECLAIMED_BYTES = metrics.counter("session_reclaimed_bytes_total", "Bytes freed by session cleanup.", ("reason",))
+INDEX_CACHE = metrics.counter("session_index_cache_total", "Loaded-index cache lookups.", ("result",))
+
+
+def session_dir(session_id):
+    return os.path.join(DATA_DIR, f"{SESSION_PREFIX}{session_id}")
+
+
+def backup_dir(session_id):
+    return os.path.join(session_dir(session_id), BACKUP_DIR)
+
+
+def upload_dir(session_id):
+    return os.path.join(UPLOADS_DIR, f"{SESSION_PREFIX}{session_id}")
+
+
+def new_session_id():
+    """Sortable timestamp plus a random suffix, so sessions created in the
+    same second (or by different workers) never share a directory."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
+
+
+def session_lock(session_id):
+    """Cross-process read/write lock guarding a session's index files.
+
+    Lock files live outside the session directory so they survive its deletion.
+    """
+    return RWFileLock(os.path.join(DATA_DIR, ".locks", f"{session_id}.lock"))
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class SessionInfo:
+    def __init__(self, session_id, last_access, size_bytes=0):
+        self.session_id = session_id
+        self.last_access = last_access
+        self.size_bytes = size_bytes
+        self.persisted_access = last_access
+
+
+class SessionRegistry:
+    """In-memory view of the sessions on disk plus a small LRU of loaded indexes.
+
+    Lookups hit the registry instead of probing the filesystem; a miss falls
+    back to one probe so sessions built by another worker are still found.
+    Eviction drops sessions idle longer than the TTL, then the least recently
+    used ones until the disk quota is met.
+    """
+
+    def __init__(self, ttl_seconds=None, max_disk_bytes=0, index_cache_size=32, pinned=()):
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.index_cache_size = index_cache_size
+        self.pinned = set(pinned)
+        self._sessions = {}
+        self._loaded = OrderedDict()
+        self._lock = threading.RLock()
+        self._scanned = False
+        self._delete_hooks = []
+
+    def on_delete(self, hook):
+        """Call ``hook(session_id)`` when a session is evicted, for state kept
+        outside the session directory (e.g. the shared vector store)."""
+        self._delete_hooks.append(hook)
+
+    def _ensure_scanned(self):
+        if self._scanned:
+            return
+        with self._lock:
+            if self._scanned:
+                return
+            if os.path.isdir(DATA_DIR):
+                for name in os.listdir(DATA_DIR):
+                    if not name.startswith(SESSION_PREFIX):
+                        continue
+                    session_id = name[len(SESSION_PREFIX):]
+                    self._sessions[session_id] = self._probe(session_id)
+            self._scanned = True
+            self._publish()
+
+    def _probe(self, session_id):
+        path = session_dir(session_id)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        return SessionInfo(session_id, mtime, _tree_size(path) + _tree_size(upload_dir(session_id)))
+
+    def _publish(self):
+        live = [s for s in self._sessions.values() if s is not None]
+        SESSIONS_ACTIVE.set(len(live))
+        SESSION_DISK_BYTES.set(sum(s.size_bytes for s in live))
+
+    def has_session(self, session_id):
+        self._ensure_scanned()
+        info = self._sessions.get(session_id)
+        if info is None:
+            # Possibly built by another worker since our scan.
+            info = self._probe(session_id) if os.path.isdir(backup_dir(session_id)) else None
+            if info is not None:
+                with self._lock:
+                    self._sessions[session_id] = info
+        return info is not None
+
+    def sessions(self):
+        """Ids of the sessions known to have an index on disk (from the
+        startup scan plus sessions registered or probed since)."""
+        self._ensure_scanned()
+        with self._lock:
+            return [session_id for session_id, info in self._sessions.items() if info is not None]
+
+    def pin(self, session_id):
+        """Exempt a session from TTL and quota eviction."""
+        self.pinned.add(session_id)
+
+    def register(self, session_id):
+        """Record a freshly (re)built session and drop any stale loaded copy."""
+        self._ensure_scanned()
+        with self._lock:
+            self._sessions[session_id] = self._probe(session_id)
+            self._loaded.pop(session_id, None)
+            self._publish()
+
+    def touch(self, session_id):
+        info = self._sessions.get(session_id)
+        if info is None:
+            return
+        now = time.time()
+        info.last_access = now
+        if now - info.persisted_access > _TOUCH_PERSIST_SECONDS:
+            info.persisted_access = now
+            try:
+                os.utime(session_dir(session_id))
+            except OSError:
+                pass
+
+    def get_loaded(self, session_id):
+        with self._lock:
+            entry = self._loaded.get(session_id)
+            if entry is not None:
+                self._loaded.move_to_end(session_id)
+        INDEX_CACHE.labels(result="hit" if entry is not None else "miss").inc()
+        if entry is not None:
+            self.touch(session_id)
+        return entry
+
+    def put_loaded(self, session_id, entry):
+        if not self.index_cache_size:
+            return
+        with self._lock:
+            self._loaded[session_id] = entry
+            self._loaded.move_to_end(session_id)
+            while len(self._loaded) > self.index_cache_size:
+                self._loaded.popitem(last=False)
+        self.touch(session_id)
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._loaded.pop(session_id, None)
+            self._publish()
+
+    def remove_uploads(self, session_id):
+        """Delete a session's temp uploads once they have been indexed."""
+        path = upload_dir(session_id)
+        size = _tree_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        RECLAIMED_BYTES.labels(reason="uploads").inc(size)
+        info = self._sessions.get(session_id)
+        if info is not None:
+            info.size_bytes = max(0, info.size_bytes - size)
+        return size
+
+    def _delete(self, info, reason):
+        with session_lock(info.session_id).try_write() as acquired:
+            if not acquired:
+                # Being queried or rebuilt right now; try again next round.
+                return 0
+            size = _tree_size(session_dir(info.session_id)) + _tree_size(upload_dir(info.session_id))
+            shutil.rmtree(session_dir(info.session_id), ignore_errors=True)
+            shutil.rmtree(upload_dir(info.session_id), ignore_errors=True)
+            for hook in self._delete_hooks:
+                hook(info.session_id)
+            self.forget(info.session_id)
+        SESSIONS_EVICTED.labels(reason=reason).inc()
+        RECLAIMED_BYTES.labels(reason=reason).inc(size)
+        logger.info("Evicted session %s (%s, %d bytes)", info.session_id, reason, size)
+        return size
+
+    def _refresh_access(self, info):
+        # Another worker may have used the session more recently than we did.
+        try:
+            info.last_access = max(info.last_access, os.path.getmtime(session_dir(info.session_id)))
+        except OSError:
+            pass
+
+    def evict(self, now=None):
+        """Apply the TTL and disk quota; returns the number of bytes reclaimed."""
+        self._ensure_scanned()
+        now = now or time.time()
+        reclaimed = 0
+        with self._lock:
+            candidates = [s for s in self._sessions.values() if s is not None and s.session_id not in self.pinned]
+        for info in candidates:
+            self._refresh_access(info)
+
+        if self.ttl_seconds:
+            for info in candidates:
+                if now - info.last_access > self.ttl_seconds:
+                    reclaimed += self._delete(info, "ttl")
+            candidates = [s for s in candidates if s.session_id in self._sessions]
+
+        if self.max_disk_bytes:
+            with self._lock:
+                total = sum(s.size_bytes for s in self._sessions.values() if s is not None)
+            for info in sorted(candidates, key=lambda s: s.last_access):
+                if total <= self.max_disk_bytes:
+                    break
+                reclaimed += self._delete(info, "quota")
+                if info.session_id not in self._sessions:
+                    total -= info.size_bytes
+        with self._lock:
+            self._publish()
+        return reclaimed
+
+
+def registry_from_config():
+    days = get_setting("session", "cleanup_after_days", default=30)
+    return SessionRegistry(
+        ttl_seconds=float(days) * 86400 if days else None,
+        max_disk_bytes=int(float(get_setting("session", "max_disk_mb", default=0) or 0) * 1024 * 1024),
+        index_cache_size=int(get_setting("session", "index_cache_size", default=32)),
+        pinned=get_setting("session", "pinned", default=[]) or [],
+    )
+
+
+registry = registry_from_config()
+
+CLEANUP_ENABLED = bool(get_setting("session", "auto_cleanup", default=True))
+CLEANUP_INTERVAL = float(get_setting("session", "cleanup_interval_minutes", default=60)) * 60
+KEEP_UPLOADS = bool(get_setting("session", "keep_uploads", default=False))
+
+
+async def cleanup_loop():
+    """Background task: apply TTL/quota eviction every `cleanup_interval_minutes`."""
+    while True:
+        try:
+            reclaimed = await asyncio.to_thread(registry.evict)
+            if reclaimed:
+                logger.info("Session cleanup reclaimed %d bytes", reclaimed)
+        except Exception:
+            logger.exception("Session cleanup failed")
+        await asyncio.sleep(CLEANUP_INTERVAL)
@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import threading
+import zlib
+
+import faiss
+import numpy as np
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.locks import RWFileLock
+from edjudicate_ai_app.app.core.mapped_index import TWO_STAGE, TWO_STAGE_CANDIDATES, TWO_STAGE_MIN_VECTORS
+from edjudicate_ai_app.app.core.quantized import binarize, two_stage_search
+
+logger = logging.getLogger(__name__)
+
+STORE_VECTORS = metrics.gauge("vector_store_vectors", "Live vectors in the shared store (this worker's view).")
+STORE_SESSIONS = metrics.gauge("vector_store_sessions", "Sessions held by the shared store.")
+STORE_COMPACTIONS = metrics.counter("vector_store_compactions_total", "Shard compactions run.")
+
+
+class _Shard:
+    """One FAISS index plus the log describing which session owns which ids.
+
+    On disk a shard is two append-only files: ``.vec`` holds raw float32 rows
+    and ``.log`` holds one JSON record per add/remove. A session's vector ids
+    are the row offsets of its block in ``.vec``, so every session owns one
+    contiguous id range. Workers replay the log incrementally to stay in
+    sync; compaction rewrites both files, which readers notice by inode.
+    """
+
+    def __init__(self, path, dim):
+        self.dim = dim
+        self.vec_path = path + ".vec"
+        self.log_path = path + ".log"
+        self.lock = RWFileLock(path + ".lock")
+        self._mutex = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self.sessions = {}      # session_id -> (start_id, chunks)
+        self._positions = {}    # session_id -> row position inside self.index
+        self._codes = {}        # session_id -> binary codes, for sessions large enough for two-stage search
+        self._log_ino = None
+        self._log_offset = 0
+        self._dead_rows = 0
+
+    # -- reading -----------------------------------------------------------
+
+    def _log_state(self):
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def _rows(self, start, count):
+        return np.fromfile(self.vec_path, dtype="float32", count=count * self.dim,
+                           offset=start * self.dim * 4).reshape(count, self.dim)
+
+    def _apply(self, record):
+        session_id = record["session"]
+        if record["op"] == "add":
+            start, chunks = record["start"], record["chunks"]
+            vectors = self._rows(start, len(chunks))
+            self.index.add_with_ids(vectors, np.arange(start, start + len(chunks), dtype="int64"))
+            self.sessions[session_id] = (start, chunks)
+            if TWO_STAGE and len(chunks) >= TWO_STAGE_MIN_VECTORS:
+                self._codes[session_id] = binarize(vectors)
+        elif session_id in self.sessions:
+            start, chunks = self.sessions.pop(session_id)
+            self._codes.pop(session_id, None)
+            self.index.remove_ids(faiss.IDSelectorRange(start, start + len(chunks)))
+            self._dead_rows += len(chunks)
+
+    def _reindex_positions(self):
+        # Removal compacts the flat index in id order, so a session's rows stay
+        # contiguous and its position is the number of live rows before it.
+        position = 0
+        self._positions = {}
+        for session_id, (start, chunks) in sorted(self.sessions.items(), key=lambda item: item[1][0]):
+            self._positions[session_id] = position
+            position += len(chunks)
+
+    def sync(self, locked=False):
+        """Catch up with records appended (or a compaction done) elsewhere."""
+        ino, size = self._log_state()
+        if ino == self._log_ino and size == self._log_offset:
+            return
+        if locked:
+            self._replay()
+        else:
+            with self.lock.read():
+                self._replay()
+
+    def _replay(self):
+        ino, size = self._log_state()
+        with self._mutex:
+            if ino != self._log_ino:
+                self._reset()
+                self._log_ino = ino
+            if ino is None or size <= self._log_offset:
+                return
+            with open(self.log_path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read(size - self._log_offset)
+            end = data.rfind(b"\n") + 1   # ignore a record still being written
+            for line in data[:end].splitlines():
+                self._apply(json.loads(line))
+            self._log_offset += end
+            self._reindex_positions()
+
+    def search(self, session_id, q_vecs, k):
+        self.sync()
+        with self._mutex:
+            if session_id not in self.sessions:
+                return None
+            start, chunks = self.sessions[session_id]
+            position = self._positions[session_id]
+            codes = self._codes.get(session_id)
+            if codes is not None:
+                # Hamming candidates from the session's codes, re-scored on its
+                # rows of the flat index (a view, valid while the mutex is held)
+                flat = faiss.downcast_index(self.index.index)
+                rows = faiss.rev_swig_ptr(flat.get_xb(), self.index.ntotal * self.dim).reshape(-1, self.dim)
+                scores, ids = two_stage_search(q_vecs, codes, rows[position:position + len(chunks)], k,
+                                               TWO_STAGE_CANDIDATES)
+                return scores, ids, chunks
+            # Search only this session's rows: a sorted range lets the flat
+            # index skip straight to them instead of testing every id.
+            params = faiss.SearchParameters(sel=faiss.IDSelectorRange(position, position + len(chunks), True))
+            scores, rows = faiss.downcast_index(self.index.index).search(q_vecs, min(k, len(chunks)), params=params)
+        return scores, np.where(rows >= 0, rows - position, -1), chunks
+
+    # -- writing -----------------------------------------------------------
+
+    def _append(self, record, vectors=None):
+        if vectors is not None:
+            row_bytes = self.dim * 4
+            with open(self.vec_path, "ab") as f:
+                size = f.tell()
+                if size % row_bytes:   # torn write from a crashed writer
+                    size -= size % row_bytes
+                    f.truncate(size)
+                record["start"] = size // row_bytes
+                f.write(vectors.tobytes())
+        with open(self.log_path, "ab") as f:
+            f.write(json.dumps(record).encode() + b"\n")
+
+    def _repair_log(self):
+        # A writer that died mid-record leaves a partial last line; drop it so
+        # the next record starts cleanly.
+        try:
+            with open(self.log_path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def add(self, session_id, chunks, vectors):
+        with self.lock.write():
+            self._repair_log()
+            self.sync(locked=True)
+            if session_id in self.sessions:
+                self._append({"op": "remove", "session": session_id})
+            self._append({"op": "add", "session": session_id, "chunks": list(chunks)}, vectors)
+            self.sync(locked=True)
+
+    def remove(self, session_id, compact_ratio=0.5):
+        with self.lock.write():
+            self._repair_log()
+            self.sync(locked=True)
+            if session_id not in self.sessions:
+                return False
+            self._append({"op": "remove", "session": session_id})
+            self.sync(locked=True)
+            total = self._dead_rows + self.index.ntotal
+            if compact_ratio and total and self._dead_rows / total > compact_ratio:
+                self._compact()
+        return True
+
+    def _compact(self):
+        """Rewrite the shard without removed rows (caller holds the write lock)."""
+        vec_tmp, log_tmp = self.vec_path + ".tmp", self.log_path + ".tmp"
+        with open(vec_tmp, "wb") as vec_out, open(log_tmp, "wb") as log_out:
+            for session_id, (start, chunks) in sorted(self.sessions.items(), key=lambda item: item[1][0]):
+                record = {"op": "add", "session": session_id, "start": vec_out.tell() // (self.dim * 4),
+                          "chunks": chunks}
+                vec_out.write(self._rows(start, len(chunks)).tobytes())
+                log_out.write(json.dumps(record).encode() + b"\n")
+        os.replace(vec_tmp, self.vec_path)
+        os.replace(log_tmp, self.log_path)
+        self.sync(locked=True)
+        STORE_COMPACTIONS.inc()
+        logger.info("Compacted %s", self.log_path)
+
+
+class SharedVectorStore:
+    """All sessions' vectors in a few sharded FAISS indexes.
+
+    Replaces one index file per session with ``shards`` append-only shard
+    files; a session always lives in the shard picked by hashing its id.
+    """
+
+    def __init__(self, directory, dim, shards=16, compact_ratio=0.5):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.compact_ratio = compact_ratio
+        self._shards = [_Shard(os.path.join(directory, f"shard_{i:03d}"), dim) for i in range(shards)]
+
+    def _shard(self, session_id):
+        return self._shards[zlib.crc32(session_id.encode()) % len(self._shards)]
+
+    def _publish(self):
+        STORE_VECTORS.set(sum(s.index.ntotal for s in self._shards))
+        STORE_SESSIONS.set(sum(len(s.sessions) for s in self._shards))
+
+    def add(self, session_id, chunks, vectors):
+        """Store (or replace) a session's chunks and their normalised vectors."""
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if vectors.shape != (len(chunks), self.dim):
+            raise ValueError(f"Expected {len(chunks)} vectors of dimension {self.dim}, got {vectors.shape}")
+        self._shard(session_id).add(session_id, chunks, vectors)
+        self._publish()
+
+    def remove(self, session_id):
+        removed = self._shard(session_id).remove(session_id, self.compact_ratio)
+        self._publish()
+        return removed
+
+    def has(self, session_id):
+        shard = self._shard(session_id)
+        shard.sync()
+        return session_id in shard.sessions
+
+    def search(self, session_id, q_vecs, k):
+        """Top-k (scores, chunk ids, chunks) for queries within one session, or
+        None if the store does not hold the session. Missing hits have id -1."""
+        return self._shard(session_id).search(session_id, np.ascontiguousarray(q_vecs, dtype="float32"), k)
+
+
+def store_from_config():
+    if get_setting("vector_db", "store", default="files") != "shared":
+        return None
+    return SharedVectorStore(
+        get_setting("vector_db", "shared", "directory", default=os.path.join("data", "vector_store")),
+        dim=int(get_setting("models", "embeddings", "embedding_dimension", default=384)),
+        shards=int(get_setting("vector_db", "shared", "shards", default=16)),
+        compact_ratio=float(get_setting("vector_db", "shared", "compact_ratio", default=0.5)),
+    )
@@ -1,7 +1,39 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from edjudicate_ai_app.app.core.metrics import timed
 
+@timed("chunk")
 def chunk_text(text: str, chunk_size=500, overlap=50):
     splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
     return splitter.split_text(text)
 
+def iter_chunks(texts, chunk_size=500, overlap=50, flush_chars=4000):
+    """Chunk a stream of text pieces (e.g. PDF pages) incrementally.
+
+    Text is buffered until `flush_chars` is reached; every chunk except the
+    last is emitted and the last one is carried over, since it may be cut
+    short by the buffer boundary.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
+    buffer = ""
+    for text in texts:
+        buffer += text
+        if len(buffer) < flush_chars:
+            continue
+        chunks = splitter.split_text(buffer)
+        if len(chunks) < 2:
+            continue
+        yield from chunks[:-1]
+        carry = buffer.rfind(chunks[-1])
+        buffer = buffer[carry:] if carry >= 0 else chunks[-1]
+    if buffer.strip():
+        yield from splitter.split_text(buffer)
+
+def iter_section_chunks(sections, chunk_size=500, overlap=50):
+    """Chunk (title, text) sections so that no chunk spans two of them.
+    Yields (section number, title, chunk)."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
+    for number, (title, text) in enumerate(sections):
+        for chunk in splitter.split_text(text):
+            yield number, title, chunk
+
 #print(chunk_text('''Paragraphs are the building blocks of papers. Many students define paragraphs in terms of length: a paragraph is a group of at least five sentences, a paragraph is half a page long, etc. In reality, though, the unity and coherence of ideas among sentences is what constitutes a paragraph. A paragraph is defined as “a group of sentences or a single sentence that forms a unit” (Lunsford and Connors 116). Length and appearance do not determine whether a section in a paper is a paragraph. For instance, in some styles of writing, particularly journalistic styles, a paragraph can be just one sentence long. Ultimately, a paragraph is a sentence or group of sentences that support one main idea. In this handout, we will refer to this as the “controlling idea,” because it controls what happens in the rest of the paragraph.How do I decide what to put in a paragraph?Before you can begin to determine what the composition of a particular paragraph will be, you must first decide on an argument and a working thesis statement for your paper. What is the most important idea that you are trying to convey to your reader? The information in each paragraph must be related to that idea. In other words, your paragraphs should remind your reader that there is a recurrent relationship between your thesis and the information in each paragraph. A working thesis functions like a seed from which your paper, and your ideas, will grow. The whole process is an organic one—a natural progression from a seed to a full-blown paper where there are direct, familial relationships between all of the ideas in the paper.The decision about what to put into your paragraphs begins with the germination of a seed of ideas; this “germination process” is better known as brainstorming. There are many techniques for brainstorming; whichever one you choose, this stage of paragraph development cannot be skipped. Building paragraphs can be like building a skyscraper: there must be a well-planned foundation that supports what you are building. Any cracks, inconsistencies, or other corruptions of the foundation can cause your whole paper to crumble.So, let’s suppose that you have done some brainstorming to develop your thesis. What else should you keep in mind as you begin to create paragraphs? Every paragraph in a paper should be'''))
\ No newline at end of file
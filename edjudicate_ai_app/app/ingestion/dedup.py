@@ -0,0 +1,193 @@
+import logging
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEDUP = bool(get_setting("text_processing", "dedup", "enabled", default=False))
+THRESHOLD = float(get_setting("text_processing", "dedup", "threshold", default=0.85))
+NUM_PERM = int(get_setting("text_processing", "dedup", "num_perm", default=64))
+BANDS = int(get_setting("text_processing", "dedup", "bands", default=16))
+SHINGLE = int(get_setting("text_processing", "dedup", "shingle_words", default=5))
+
+STRIP = bool(get_setting("text_processing", "boilerplate", "enabled", default=False))
+SAMPLE_PAGES = int(get_setting("text_processing", "boilerplate", "sample_pages", default=8))
+MIN_FRACTION = float(get_setting("text_processing", "boilerplate", "min_fraction", default=0.6))
+EDGE_LINES = int(get_setting("text_processing", "boilerplate", "edge_lines", default=3))
+
+CHUNKS = metrics.counter("dedup_chunks_total", "Chunks kept or removed as near-duplicates before embedding.",
+                         ("result",))
+LINES_STRIPPED = metrics.counter("boilerplate_lines_removed_total", "Repeated header/footer lines removed from pages.")
+SECONDS_SAVED = metrics.counter("dedup_embed_seconds_saved_total",
+                                "Estimated embedding time saved by not embedding removed chunks.")
+
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+_SPACE = re.compile(r"\s+")
+
+
+def _edge_key(line):
+    # Page numbers and dates change from page to page; the line around them does not
+    return _SPACE.sub(" ", _DIGITS.sub("#", line.strip().lower()))
+
+
+def _edges(lines, edge_lines):
+    """Positions of the first and last ``edge_lines`` non-empty lines, fewer
+    on short pages so that at least a third of a page counts as body."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    n = min(edge_lines, len(filled) // 3)
+    return set(filled[:n]) | set(filled[len(filled) - n:]) if n else set()
+
+
+def repeated_edge_lines(pages, min_fraction=MIN_FRACTION, edge_lines=EDGE_LINES):
+    """Keys of the lines that recur at the top or bottom of at least
+    ``min_fraction`` of ``pages`` (each a list of lines). Empty for fewer
+    than three pages."""
+    if len(pages) < 3:
+        return set()
+    seen = Counter()
+    for lines in pages:
+        seen.update({_edge_key(lines[i]) for i in _edges(lines, edge_lines)})
+    needed = max(2, min_fraction * len(pages))
+    return {key for key, count in seen.items() if count >= needed and key}
+
+
+def boilerplate_positions(lines, repeated, edge_lines=EDGE_LINES):
+    """Positions in ``lines`` of edge lines found in ``repeated``."""
+    if not repeated:
+        return set()
+    drop = {i for i in _edges(lines, edge_lines) if _edge_key(lines[i]) in repeated}
+    LINES_STRIPPED.inc(len(drop))
+    return drop
+
+
+def strip_boilerplate(pages, sample=SAMPLE_PAGES, min_fraction=MIN_FRACTION, edge_lines=EDGE_LINES):
+    """Remove running headers and footers from a stream of page texts.
+
+    The first ``sample`` pages are buffered to learn which lines recur at
+    the top or bottom of at least ``min_fraction`` of them; those lines are
+    then dropped from the edges of every page. Documents shorter than three
+    pages are passed through unchanged.
+    """
+    pages = iter(pages)
+    head = []
+    for page in pages:
+        head.append(page)
+        if len(head) >= sample:
+            break
+    repeated = repeated_edge_lines([page.splitlines() for page in head], min_fraction, edge_lines)
+
+    def clean(page):
+        lines = page.splitlines(keepends=True)
+        drop = boilerplate_positions(lines, repeated, edge_lines)
+        return "".join(line for i, line in enumerate(lines) if i not in drop) if drop else page
+
+    for page in head:
+        yield clean(page)
+    for page in pages:
+        yield clean(page)
+
+
+def _shingles(text, size):
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class Deduplicator:
+    """Streaming near-duplicate filter for chunks, using MinHash signatures
+    and LSH banding.
+
+    ``add`` returns the position of the kept chunk a new chunk maps to,
+    which is a new position if the chunk was kept. ``kept`` holds the
+    surviving chunks and ``sources`` lists, for each of them, the sources of
+    every original chunk it stands for, so provenance survives the filter.
+    """
+
+    def __init__(self, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS, shingle=SHINGLE, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self.threshold = threshold
+        self.bands = bands
+        self.shingle = shingle
+        self.kept, self.sources, self.mapping = [], [], []
+        self._shingle_sets = []
+        self._exact = {}
+        self._buckets = {}
+
+    def _signature(self, shingles):
+        x = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # Multiply-shift hashing: the high 32 bits of a*x + b (mod 2**64), a odd
+        with np.errstate(over="ignore"):
+            hashed = (self._a[:, None] * x[None, :] + self._b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1)
+
+    def _keep(self, chunk, source, shingles, keys):
+        position = len(self.kept)
+        self.kept.append(chunk)
+        self.sources.append([source])
+        self._shingle_sets.append(shingles)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(position)
+        return position
+
+    def add(self, chunk, source=None):
+        exact = _SPACE.sub(" ", chunk.strip().lower())
+        position = self._exact.get(exact)
+        if position is None:
+            shingles = _shingles(chunk, self.shingle)
+            rows = len(self._a) // self.bands
+            signature = self._signature(shingles)
+            keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+            candidates = {p for key in keys for p in self._buckets.get(key, ())}
+            # Confirm LSH candidates with the exact Jaccard similarity of the shingle sets
+            for candidate in sorted(candidates):
+                other = self._shingle_sets[candidate]
+                if len(shingles & other) >= self.threshold * len(shingles | other):
+                    position = self._exact[exact] = candidate
+                    break
+            if position is None:
+                position = self._keep(chunk, source, shingles, keys)
+                self._exact[exact] = position
+                self.mapping.append(position)
+                CHUNKS.labels(result="kept").inc()
+                return position
+        self.sources[position].append(source)
+        self.mapping.append(position)
+        CHUNKS.labels(result="removed").inc()
+        return position
+
+    @property
+    def removed(self):
+        return len(self.mapping) - len(self.kept)
+
+    def provenance(self):
+        return {"original_chunks": len(self.mapping), "sources": self.sources}
+
+    def report(self, embed_seconds):
+        """Log the removal rate and the embedding time it saved, estimated
+        from ``embed_seconds`` spent on the kept chunks."""
+        saved = embed_seconds / max(len(self.kept), 1) * self.removed
+        SECONDS_SAVED.inc(saved)
+        logger.info("Dedup removed %d of %d chunks (%.1f%%), saving about %.2fs of embedding",
+                    self.removed, len(self.mapping), 100 * self.removed / max(len(self.mapping), 1), saved)
+        return saved
+
+
+def dedupe(chunks, sources=None):
+    """Filter ``chunks`` in one go; returns the ``Deduplicator`` holding the
+    kept chunks and their provenance."""
+    dedup = Deduplicator()
+    for i, chunk in enumerate(chunks):
+        dedup.add(chunk, sources[i] if sources is not None else i)
+    return dedup
@@ -0,0 +1,46 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from edjudicate_ai_app.app.core.config import get_setting
+
+MAX_BYTES = int(float(get_setting("download", "max_size_mb", default=50)) * 1024 * 1024)
+TIMEOUT = float(get_setting("download", "timeout", default=20))
+CHUNK_BYTES = 64 * 1024
+
+# One pooled session per process: repeat downloads from the same host reuse
+# warm TCP/TLS connections instead of handshaking every time.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=int(get_setting("download", "pool_connections", default=10)),
+    pool_maxsize=int(get_setting("download", "pool_maxsize", default=10)),
+)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+
+class DocumentTooLarge(ValueError):
+    pass
+
+
+class Download:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+def fetch(url: str, headers: dict | None = None, max_bytes: int = MAX_BYTES, timeout: float = TIMEOUT) -> Download:
+    """Stream `url` into memory over the pooled session, aborting as soon as
+    the body exceeds `max_bytes` rather than after buffering all of it."""
+    with _session.get(url, headers=headers or {}, stream=True, timeout=timeout) as resp:
+        if resp.status_code != 200:
+            return Download(resp.status_code, resp.headers, b"")
+        declared = resp.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise DocumentTooLarge(f"Document is {int(declared)} bytes; limit is {max_bytes}")
+        buf = bytearray()
+        for chunk in resp.iter_content(CHUNK_BYTES):
+            buf += chunk
+            if len(buf) > max_bytes:
+                raise DocumentTooLarge(f"Document exceeds {max_bytes} bytes")
+        return Download(resp.status_code, resp.headers, bytes(buf))
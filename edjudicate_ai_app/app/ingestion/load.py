@@ -1,7 +1,9 @@
 import os
 import fitz #PyMuPDF
 import docx
+from edjudicate_ai_app.app.core.metrics import timed
 
+@timed("extract")
 def load_content(file_path: str) -> str:
     if file_path.endswith(".pdf"):
         return extract_pdf(file_path)
@@ -17,8 +19,74 @@ def extract_pdf(file_path):
             text += page.get_text()
     return text
 
+@timed("extract")
+def load_pages(file_path: str) -> list:
+    """Like `load_content`, but a PDF comes back page by page (a DOCX as a
+    single page), for header/footer detection."""
+    if file_path.endswith(".pdf"):
+        with fitz.open(file_path) as doc:
+            return [page.get_text() for page in doc]
+    return [load_content(file_path)]
+
+def iter_pdf_pages(data: bytes):
+    """Yield the text of an in-memory PDF page by page. Opening it is also the
+    validity check, so download validation and extraction share a single parse."""
+    try:
+        doc = fitz.open(stream=data, filetype="pdf")
+    except Exception as e:
+        raise ValueError("Not a valid PDF") from e
+    with doc:
+        for page in doc:
+            yield page.get_text()
+
+def iter_pdf_layout(data: bytes):
+    """Yield each page of an in-memory PDF as a list of (text, font size,
+    bold) lines, for heading detection."""
+    try:
+        doc = fitz.open(stream=data, filetype="pdf")
+    except Exception as e:
+        raise ValueError("Not a valid PDF") from e
+    with doc:
+        for page in doc:
+            lines = []
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", ()):
+                    spans = [span for span in line["spans"] if span["text"].strip()]
+                    if spans:
+                        lines.append(("".join(span["text"] for span in line["spans"]).strip(),
+                                      max(span["size"] for span in spans),
+                                      all(span["flags"] & 16 for span in spans)))
+            yield lines
+
+@timed("extract")
+def load_pdf_bytes(data: bytes) -> str:
+    return "".join(iter_pdf_pages(data))
+
 def extract_docx(file_path):
     doc = docx.Document(file_path)
     return "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
 
+def extract_docx_sections(file_path):
+    """(title, text) sections of a DOCX, split at paragraphs styled as
+    headings. Text before the first heading gets an empty title."""
+    doc = docx.Document(file_path)
+    sections, title, body = [], "", []
+    for para in doc.paragraphs:
+        text = para.text.strip()
+        if not text:
+            continue
+        style = para.style.name if para.style is not None else ""
+        if style.startswith("Heading") or style == "Title":
+            if body:
+                sections.append((title, "\n".join(body)))
+                title, body = text, []
+            else:
+                # Consecutive headings (e.g. part and chapter) title one section
+                title = f"{title} {text}".strip()
+        else:
+            body.append(text)
+    if body:
+        sections.append((title, "\n".join(body)))
+    return sections
+
 #print(load_content("data\\docs\\EDLHLGA23009V012223.pdf"))
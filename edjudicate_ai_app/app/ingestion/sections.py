@@ -0,0 +1,100 @@
+from collections import Counter
+from itertools import chain, islice
+
+from edjudicate_ai_app.app.core import section_index
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.metrics import timed
+from edjudicate_ai_app.app.ingestion import dedup
+from edjudicate_ai_app.app.ingestion.chunk import chunk_text, iter_section_chunks
+from edjudicate_ai_app.app.ingestion.load import extract_docx_sections, iter_pdf_layout, load_content, load_pages
+
+HEADING_RATIO = float(get_setting("text_processing", "sections", "heading_ratio", default=1.15))
+MAX_HEADING_CHARS = int(get_setting("text_processing", "sections", "max_heading_chars", default=100))
+
+
+def _body_size(pages):
+    """The font size carrying most of the text: the body size."""
+    sizes = Counter()
+    for lines in pages:
+        for text, size, _ in lines:
+            sizes[round(size, 1)] += len(text)
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def _is_heading(text, size, bold, body):
+    if len(text) > MAX_HEADING_CHARS or not any(c.isalpha() for c in text):
+        return False
+    # Larger than the body text, or a whole line set in bold
+    return size >= body * HEADING_RATIO or (bold and size >= body)
+
+
+def iter_pdf_sections(data: bytes, strip=False, sample=dedup.SAMPLE_PAGES):
+    """Yield the (title, text) sections of an in-memory PDF as pages are read.
+
+    Headings are lines set larger than the body text (estimated from the
+    first ``sample`` pages) or entirely in bold. With ``strip``, running
+    headers and footers learned from the same pages are dropped, unless
+    they are set as headings.
+    Raises ValueError if ``data`` is not a PDF.
+    """
+    pages = iter_pdf_layout(data)
+    head = list(islice(pages, sample))
+    body = _body_size(head)
+    repeated = dedup.repeated_edge_lines([[line[0] for line in page] for page in head]) if strip else set()
+
+    title, text = "", []
+    for page in chain(head, pages):
+        drop = dedup.boilerplate_positions([line[0] for line in page], repeated)
+        for i, (line, size, bold) in enumerate(page):
+            heading = _is_heading(line, size, bold, body)
+            # Numbered headings opening every page look like running headers once digits are ignored
+            if i in drop and not heading:
+                continue
+            if not heading:
+                text.append(line)
+            elif text:
+                yield title, "\n".join(text)
+                title, text = line, []
+            else:
+                # Consecutive heading lines (e.g. a number and a name) title one section
+                merged = f"{title} {line}".strip()
+                title = merged if len(merged) <= 2 * MAX_HEADING_CHARS else line
+    if text:
+        yield title, "\n".join(text)
+
+
+@timed("extract")
+def load_sections(file_path: str) -> list:
+    """(title, text) sections of a PDF or DOCX file."""
+    if file_path.endswith(".pdf"):
+        with open(file_path, "rb") as f:
+            return list(iter_pdf_sections(f.read(), strip=dedup.STRIP))
+    if file_path.endswith(".docx"):
+        return extract_docx_sections(file_path)
+    raise ValueError("Unsupported file type. Only .pdf and .docx are supported.")
+
+
+def file_chunks(file_path: str) -> list:
+    """(section, title, chunk) triples for a PDF or DOCX file. Without
+    hierarchical retrieval the whole file is one untitled section."""
+    if section_index.ENABLED:
+        return list(iter_section_chunks(load_sections(file_path)))
+    if dedup.STRIP:
+        text = "".join(dedup.strip_boilerplate(load_pages(file_path)))
+    else:
+        text = load_content(file_path)
+    return [(0, "", chunk) for chunk in chunk_text(text)]
+
+
+def append_chunks(pieces, document, chunks, sections):
+    """Add one file's (section, title, chunk) triples to the combined chunk
+    list and the (titles, chunk sections, section documents) table."""
+    titles, chunk_sections, documents = sections
+    base = len(titles)
+    for section, title, chunk in pieces:
+        while len(titles) <= base + section:
+            titles.append("")
+            documents.append(document)
+        titles[base + section] = title
+        chunks.append(chunk)
+        chunk_sections.append(base + section)
@@ -0,0 +1,141 @@
+import hashlib
+import os
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from edjudicate_ai_app.app.core.config import get_setting
+
+MAX_FILE_BYTES = int(float(get_setting("ui", "max_file_size_mb", default=50)) * 1024 * 1024)
+MAX_UPLOAD_FILES = int(get_setting("security", "max_upload_files", default=10))
+ALLOWED_EXTENSIONS = tuple(get_setting("security", "allowed_file_extensions", default=[".pdf", ".docx"]))
+CHUNK_BYTES = int(get_setting("performance", "upload", "chunk_kb", default=1024)) * 1024
+
+# Multipart boundaries and part headers on top of the files themselves
+_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class BadUpload(ValueError):
+    pass
+
+
+class SavedUpload:
+    def __init__(self, filename, path, size, sha256):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+class _FormWriter:
+    """MultipartParser callbacks that write each file part of ``field`` to
+    ``directory`` as it is parsed, hashing it on the way and raising as
+    soon as a limit is broken. Other form fields are ignored."""
+
+    def __init__(self, directory, field, max_bytes, max_files, allowed):
+        self.directory = directory
+        self.field = field
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.allowed = allowed
+        self.saved = []
+        self._headers = {}
+        self._header = b""
+        self._value = b""
+        self._out = None
+        self._upload = self._digest = None
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": lambda data, start, end: self._add("_header", data[start:end]),
+            "on_header_value": lambda data, start, end: self._add("_value", data[start:end]),
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _add(self, name, data):
+        setattr(self, name, getattr(self, name) + data)
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _header_end(self):
+        self._headers[self._header.lower()] = self._value
+        self._header = self._value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("utf-8", "replace") != self.field or b"filename" not in options:
+            return
+        filename = os.path.basename(options[b"filename"].decode("utf-8", "replace")) or "upload"
+        if len(self.saved) >= self.max_files:
+            raise BadUpload(f"At most {self.max_files} files can be uploaded per session")
+        if not filename.lower().endswith(self.allowed):
+            raise BadUpload(f"Unsupported file type: {filename}")
+        os.makedirs(self.directory, exist_ok=True)
+        # Stored under its position so uploads sharing a name do not collide
+        path = os.path.join(self.directory, f"{len(self.saved):03d}_{filename}")
+        self._out = open(path, "wb", buffering=CHUNK_BYTES)
+        self._upload = SavedUpload(filename, path, 0, None)
+        self._digest = hashlib.sha256()
+
+    def _part_data(self, data, start, end):
+        if self._out is None:
+            return
+        upload = self._upload
+        upload.size += end - start
+        if upload.size > self.max_bytes:
+            raise UploadTooLarge(f"{upload.filename} exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit")
+        chunk = data[start:end]
+        self._digest.update(chunk)
+        self._out.write(chunk)
+
+    def _part_end(self):
+        if self._out is None:
+            return
+        self._out.close()
+        self._out = None
+        self._upload.sha256 = self._digest.hexdigest()
+        self.saved.append(self._upload)
+
+    def close(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+
+async def receive_uploads(request, directory, field="uploaded_files", max_bytes=MAX_FILE_BYTES,
+                          max_files=MAX_UPLOAD_FILES, allowed=ALLOWED_EXTENSIONS) -> list[SavedUpload]:
+    """Parse a multipart request body straight off the connection, writing
+    every ``field`` file to ``directory`` and hashing it with SHA-256 as it
+    arrives. Nothing is spooled first: a declared Content-Length beyond what
+    the limits allow is refused before reading, and a file is abandoned with
+    ``UploadTooLarge`` as soon as it passes ``max_bytes``. The caller removes
+    ``directory`` when this raises."""
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise BadUpload("Expected a multipart/form-data upload")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_files * max_bytes + _FORM_OVERHEAD:
+        raise UploadTooLarge(f"Upload of {int(declared)} bytes exceeds the {max_files} x "
+                             f"{max_bytes // (1024 * 1024)} MB limit")
+
+    writer = _FormWriter(directory, field, max_bytes, max_files, allowed)
+    parser = MultipartParser(options[b"boundary"], writer.callbacks())
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(parser.write, chunk)
+        parser.finalize()
+    finally:
+        writer.close()
+    if not writer.saved:
+        raise BadUpload(f"No files were uploaded in field '{field}'")
+    return writer.saved
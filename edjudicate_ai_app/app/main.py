@@ -1,23 +1,67 @@
-from fastapi import FastAPI, UploadFile, File, Header, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from app.core.retriever import retrieve_chunks, build_index
-from app.core.engine import evaluate_decision, answer_question
-from app.ingestion.load import load_content
-from app.ingestion.chunk import chunk_text
-from typing import List
-from datetime import datetime
+from edjudicate_ai_app.app.core.retriever import retrieve_scored_chunks, build_index, index_exists, retrieve_chunks_for_vectors
+from edjudicate_ai_app.app.core.engine import evaluate_decision, evaluate_decisions
+from edjudicate_ai_app.app.core.llm import request_deadline
+from edjudicate_ai_app.app.core.pipeline import NOT_FOUND, answer_all, embed_async, index_pdf_bytes
+from edjudicate_ai_app.app.core import claims, metrics, question_bank, section_index
+from edjudicate_ai_app.app.core.config import get_setting
+from edjudicate_ai_app.app.core.federated import MAX_K as FEDERATED_MAX_K, federated_search, load_library
+from edjudicate_ai_app.app.core.sessions import CLEANUP_ENABLED, KEEP_UPLOADS, cleanup_loop, new_session_id, registry, upload_dir
+from edjudicate_ai_app.app.core.embed_service import EmbeddingServiceError
+from edjudicate_ai_app.app.core.doc_cache import (
+    DOC_CACHE_RESULTS, CacheEntry, DocumentCache, cache_from_config, content_hash, session_id_for,
+)
+from edjudicate_ai_app.app.admission import AdmissionMiddleware
+from edjudicate_ai_app.app.observability import ServerTimingMiddleware
+from edjudicate_ai_app.app.profiling import ProfilingMiddleware, profile_section, profiled, router as profiling_router
+from edjudicate_ai_app.app.ingestion.sections import append_chunks, file_chunks
+from edjudicate_ai_app.app.ingestion.download import Download, DocumentTooLarge, fetch
+from edjudicate_ai_app.app.ingestion.upload import UploadTooLarge, receive_uploads
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import json
+import logging
 import os
-import tempfile
+import time
 import requests
-import fitz
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PARALLELISM = int(get_setting("performance", "upload", "max_parallel", default=4))
+MAX_BATCH_QUERIES = int(get_setting("performance", "query_batch", "max_queries", default=100))
+MAX_BATCH_K = int(get_setting("performance", "query_batch", "max_k", default=20))
+
+@asynccontextmanager
+async def lifespan(app):
+    cleanup = asyncio.create_task(cleanup_loop()) if CLEANUP_ENABLED else None
+    try:
+        await run_in_threadpool(load_library)
+    except Exception as e:
+        print("Policy library could not be loaded:", e)
+    yield
+    if cleanup:
+        cleanup.cancel()
 
 app = FastAPI(
     title="Edjudicate AI",
     description="Policy Explainer AI is an intelligent, session-based insurance assistant that combines semantic document retrieval using FAISS with reasoning powered by Gemini 1.5 Flash. Users can upload multiple policy documents, ask natural language questions, and receive structured, justified decisions in real time. Each session is self-contained, allowing dynamic indexing, accurate clause referencing, and clean separation of uploaded contexts.",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan
 )
 
+# Opt-in cProfile of individual requests (admin token or 1-in-N sampling).
+app.add_middleware(ProfilingMiddleware)
+app.include_router(profiling_router)
+
+# Admission control: bounded concurrency and queues per endpoint lane.
+# Registered before CORS so rejections still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
 # CORS settings
 app.add_middleware(
     CORSMiddleware,
@@ -27,60 +71,188 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so Server-Timing and request metrics include admission queueing.
+app.add_middleware(ServerTimingMiddleware)
+
 
 class QueryRequest(BaseModel):
     query: str
     session_id : str
 
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    session_id: str
+    k: int = 5
+
+
+class FederatedQueryRequest(BaseModel):
+    query: str
+    session_ids: Optional[List[str]] = None  # All indexed sessions when omitted
+    k: int = 5
+    include_library: bool = True
+
 @app.get("/")
 def root():
     return {"message": "Edjudicate AI is live!"}
 
+@app.get("/stats")
+def stats():
+    return metrics.snapshot()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/query")
+@profiled
 def query_docs(request: QueryRequest):
     session_id = request.session_id
+    deadline = request_deadline()
     try:
-        relevant_chunks = retrieve_chunks(request.query,session_id, k=5)
-        answer = evaluate_decision(request.query,session_id)
+        hits = retrieve_scored_chunks(request.query, session_id, k=5)
+        relevant_chunks = [chunk for chunk, _ in hits]
+        answer = evaluate_decision(request.query,session_id, deadline=deadline)
         print("Query received:", request.query)
         print("Chunks retrieved:", relevant_chunks)
         print("Answer returned:", answer)
         return {
             "query": request.query,
             "response": answer,
-            "retrieved_clauses": relevant_chunks
+            "retrieved_clauses": relevant_chunks,
+            "retrieval_scores": [score for _, score in hits]
         }
     except Exception as e:
         return {"error": str(e)}
 
 
+@app.post("/query/batch")
+@profiled
+def batch_query(request: BatchQueryRequest):
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    if not 1 <= request.k <= MAX_BATCH_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_BATCH_K}")
+    if not index_exists(request.session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    results = evaluate_decisions(request.queries, request.session_id, k=request.k,
+                                 deadline=request_deadline())
+    return {"session_id": request.session_id, "results": results}
+
+
+@app.post("/query/federated")
+@profiled
+def federated_query(request: FederatedQueryRequest):
+    if not 1 <= request.k <= FEDERATED_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {FEDERATED_MAX_K}")
+    try:
+        hits, missing, omitted = federated_search(request.query, request.session_ids, k=request.k,
+                                                  include_library=request.include_library)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "query": request.query,
+        "results": hits,
+        "missing_sessions": missing,
+        "sessions_omitted": omitted
+    }
+
+
+
+@app.post("/claims/batch")
+async def claims_batch(session_id: str = Form(...), claims_file: UploadFile = File(...),
+                       job_id: Optional[str] = Form(None), concurrency: int = Form(claims.CONCURRENCY)):
+    """Adjudicate a CSV/JSONL file of claim queries against a session.
+
+    Results stream back as JSON lines as each claim is decided, followed by
+    a summary line. They are also kept under the job id (see the X-Job-Id
+    header); posting the same file again with that job_id resumes the job.
+    """
+    if not index_exists(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        rows = claims.read_claims(await claims_file.read(), claims_file.filename or "")
+        job_id = job_id or new_session_id()
+        path = claims.job_path(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if claims.job_running(path):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already running")
+
+    def stream():
+        start = time.perf_counter()
+        records = []
+        for record in claims.adjudicate(rows, session_id, path,
+                                        concurrency=min(max(1, concurrency), claims.CONCURRENCY)):
+            records.append(record)
+            yield json.dumps(record) + "\n"
+        summary = claims.summarize(records, time.perf_counter() - start, skipped=len(rows) - len(records))
+        yield json.dumps({"job_id": job_id, "summary": summary}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Job-Id": job_id})
+
 
 @app.post("/upload_docs")
-async def upload_docs(uploaded_files: List[UploadFile] = File(...)):
+@profiled
+async def upload_docs(request: Request):
+    """Index the files of the multipart field ``uploaded_files`` into one new session."""
     responses = []
     alltext_chunks = []
-    session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    index_dir = f"session_{session_id}"
+    sources = []
+    sections = ([], [], [])
+    session_id = new_session_id()
 
+    # Parse the form off the connection, writing and hashing each file as it arrives
     try:
-        for uploaded_file in uploaded_files:
-            contents = await uploaded_file.read()
-            file_path = f"temp_uploads/{index_dir}/{uploaded_file.filename}"
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "wb") as f:
-                f.write(contents)
+        uploads = await receive_uploads(request, upload_dir(session_id))
+    except UploadTooLarge as e:
+        registry.remove_uploads(session_id)
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        registry.remove_uploads(session_id)
+        raise HTTPException(status_code=400, detail=str(e))
 
-            raw_text = load_content(file_path)
-            text_chunks = chunk_text(raw_text)
-            alltext_chunks.extend(text_chunks)
+    try:
+        # Identical files are parsed once
+        saved, seen = [], {}
+        for upload in uploads:
+            original = seen.setdefault(upload.sha256, upload)
+            if original is not upload:
+                os.unlink(upload.path)
+            saved.append((upload, original))
+
+        # Extract and chunk the unique files concurrently
+        limit = asyncio.Semaphore(UPLOAD_PARALLELISM)
+
+        async def extract(upload):
+            async with limit:
+                return await run_in_threadpool(profile_section, file_chunks, upload.path)
 
+        unique = list(seen.values())
+        chunks_by_hash = dict(zip(seen, await asyncio.gather(*(extract(u) for u in unique))))
+
+        for document, (upload, original) in enumerate(saved):
+            if original is not upload:
+                responses.append({
+                    "filename": upload.filename,
+                    "status": f"duplicate of {original.filename}, skipped",
+                    "session_id": session_id
+                })
+                continue
+            append_chunks(chunks_by_hash[upload.sha256], document, alltext_chunks, sections)
+            sources.extend((upload.filename, i) for i in range(len(chunks_by_hash[upload.sha256])))
             responses.append({
-                "filename": uploaded_file.filename,
+                "filename": upload.filename,
                 "status": "parsed and added to combined index" ,
-                "session_id": session_id 
+                "session_id": session_id ,
+                "sha256": upload.sha256
             })
 
-        build_index(alltext_chunks, session_id, force_rebuild=True)
+        await run_in_threadpool(profile_section, build_index, alltext_chunks, session_id, True, sources,
+                                 sections if section_index.ENABLED else None)
+        question_bank.schedule(session_id)
+        if not KEEP_UPLOADS:
+            registry.remove_uploads(session_id)
 
         return {
             "status": "success",
@@ -92,32 +264,77 @@ async def upload_docs(uploaded_files: List[UploadFile] = File(...)):
     except Exception as e:
         return {"error": str(e)}
 
+document_cache = cache_from_config(index_exists=index_exists)
+
+
 class HackRxRequest(BaseModel):
     documents: str
     questions: List[str]
 
 
-def _download_pdf_to_temp(url: str) -> str:
-    resp = requests.get(url, timeout=20)
-    if resp.status_code != 200:
+@metrics.timed("download")
+def _fetch_document(url: str, headers: dict | None = None) -> Download:
+    try:
+        resp = fetch(url, headers=headers)
+    except DocumentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except requests.RequestException as e:
+        raise HTTPException(status_code=400, detail=f"Failed to download document: {e}")
+    if resp.status_code not in (200, 304):
         raise HTTPException(status_code=400, detail=f"Failed to download document. Status: {resp.status_code}")
-    # Validate it's a PDF by attempting to open via PyMuPDF
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(resp.content)
-        tmp_path = tmp.name
+    return resp
+
+
+def _index_pdf_bytes(content: bytes, session_id: str):
     try:
-        with fitz.open(tmp_path) as _:
-            pass
-    except Exception:
-        os.unlink(tmp_path)
-        raise HTTPException(status_code=400, detail="Downloaded file is not a valid PDF")
-    return tmp_path
+        index_pdf_bytes(content, session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Downloaded file could not be indexed: {e}")
+    question_bank.schedule(session_id)
+
 
+def _session_for_document(url: str) -> str:
+    """Return a session whose index holds the document at `url`.
 
-def _index_single_pdf(temp_pdf_path: str, session_id: str):
-    raw_text = load_content(temp_pdf_path)
-    text_chunks = chunk_text(raw_text)
-    build_index(text_chunks, session_id, force_rebuild=True)
+    Known URLs are revalidated with a conditional GET; a 304, or a 200 whose
+    content hash matches an already indexed document, skips extraction and
+    embedding entirely.
+    """
+    if document_cache is None:
+        session_id = new_session_id()
+        _index_pdf_bytes(_fetch_document(url).content, session_id)
+        return session_id
+
+    entry = document_cache.get(url)
+    if entry and document_cache.is_fresh(entry):
+        DOC_CACHE_RESULTS.labels(result="fresh").inc()
+        return entry.session_id
+
+    resp = _fetch_document(url, DocumentCache.conditional_headers(entry))
+    if resp.status_code == 304:
+        if entry is None:
+            raise HTTPException(status_code=400, detail="Failed to download document. Status: 304")
+        DOC_CACHE_RESULTS.labels(result="revalidated").inc()
+        document_cache.put(entry)
+        return entry.session_id
+
+    digest = content_hash(resp.content)
+    with document_cache.lock(digest):
+        session_id = document_cache.session_for_content(digest)
+        if session_id:
+            DOC_CACHE_RESULTS.labels(result="same_content").inc()
+        else:
+            DOC_CACHE_RESULTS.labels(result="miss").inc()
+            session_id = session_id_for(digest)
+            _index_pdf_bytes(resp.content, session_id)
+        document_cache.put(CacheEntry(
+            url=url,
+            session_id=session_id,
+            content_hash=digest,
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        ))
+    return session_id
 
 
 def _bearer_token(auth_header: str | None) -> str:
@@ -128,31 +345,35 @@ def _bearer_token(auth_header: str | None) -> str:
 
 @app.post("/hackrx/run")
 @app.post("/api/v1/hackrx/run")
+@profiled
 def hackrx_run(payload: HackRxRequest, Authorization: str | None = Header(default=None)):
     # Validate auth (accept any non-empty token for now; replace with real key check if needed)
     _ = _bearer_token(Authorization)
+    deadline = request_deadline()
 
-    # Build a fresh session for this request
-    session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Questions don't depend on the document: embed them while it downloads and indexes
+    question_vectors = embed_async(payload.questions)
 
-    # Download and index document
-    temp_pdf = _download_pdf_to_temp(payload.documents)
-    try:
-        _index_single_pdf(temp_pdf, session_id)
-    finally:
-        try:
-            os.unlink(temp_pdf)
-        except Exception:
-            pass
+    # Reuse the cached index for this document, or download and index it
+    session_id = _session_for_document(payload.documents)
 
-    # Answer each question
+    # Standard questions already answered at ingestion are served directly;
+    # the rest are searched in one pass and answered concurrently
     answers: List[str] = []
-    for q in payload.questions:
+    if payload.questions:
         try:
-            ans = answer_question(q, session_id, k=5)
-        except Exception:
-            ans = "Information not found in the provided document."
-        answers.append(ans)
+            vectors = question_vectors.result()
+        except (OSError, EmbeddingServiceError):
+            # The questions are embedded together, so none of them can be retrieved for
+            logger.exception("Question embedding failed for session %s", session_id)
+            return {"answers": [NOT_FOUND] * len(payload.questions)}
+        answers = question_bank.lookup(session_id, vectors)
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        if pending:
+            questions = [payload.questions[i] for i in pending]
+            clause_lists = retrieve_chunks_for_vectors([vectors[i] for i in pending], session_id, k=5, queries=questions)
+            for i, answer in zip(pending, answer_all(questions, clause_lists, deadline=deadline)):
+                answers[i] = answer
 
     return {
         "success": True,
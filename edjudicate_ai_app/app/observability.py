@@ -0,0 +1,56 @@
+import time
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+
+SERVER_TIMING_ENABLED = bool(get_setting("observability", "server_timing", default=True))
+
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests served.", ("route", "status"))
+HTTP_REQUEST_SECONDS = metrics.histogram("http_request_seconds", "HTTP request latency.", ("route",))
+
+
+def _server_timing(timings, total):
+    # Stages that run several times per request (embed, search, llm) are summed.
+    merged = {}
+    for stage, seconds in timings:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode()
+
+
+class ServerTimingMiddleware:
+    """Collects per-stage timings recorded with ``metrics.timed`` during a
+    request, reports them in a ``Server-Timing`` header and records request
+    counts/latency per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings, token = metrics.start_request_timings()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - start)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.end_request_timings(token)
+            if metrics.METRICS_ENABLED:
+                route = scope.get("route")
+                route = getattr(route, "path", "unmatched")
+                HTTP_REQUESTS.labels(route=route, status=status["code"]).inc()
+                HTTP_REQUEST_SECONDS.labels(route=route).observe(time.perf_counter() - start)
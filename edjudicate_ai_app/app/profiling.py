@@ -0,0 +1,220 @@
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import itertools
+import os
+import pstats
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from edjudicate_ai_app.app.core import metrics
+from edjudicate_ai_app.app.core.config import get_setting
+
+_prof_cfg = get_setting("profiling", default={}) or {}
+
+PROFILE_DIR = _prof_cfg.get("directory", "profiles")
+SAMPLE_EVERY = int(_prof_cfg.get("sample_every", 0) or 0)
+MAX_PROFILES = int(_prof_cfg.get("max_profiles", 200))
+PROFILED_PATHS = set(_prof_cfg.get("paths", ["/query", "/upload_docs", "/hackrx/run", "/api/v1/hackrx/run"]))
+
+PROFILES_SAVED = metrics.counter("profiles_saved_total", "Request profiles written to disk.", ("reason",))
+
+# Only one cProfile profiler may be active in the interpreter at a time.
+_profiler_lock = threading.Lock()
+_sample_counter = itertools.count(1)
+_profile_request = ContextVar("profile_request", default=None)
+# Profiles of the synchronous sections of the async handler being profiled
+_section_profiles = ContextVar("section_profiles", default=None)
+
+
+def _admin_token():
+    return os.getenv("EDJ_ADMIN_TOKEN") or _prof_cfg.get("admin_token") or None
+
+
+def _is_admin(token):
+    expected = _admin_token()
+    return bool(expected and token and hmac.compare_digest(token, expected))
+
+
+def _require_admin(token):
+    if not _is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+class _ProfileRequest:
+    def __init__(self, reason, route):
+        self.reason = reason
+        self.route = route
+        self.profile_id = None
+
+
+def _save(profilers, request):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = request.route.strip("/").replace("/", "_") or "root"
+    profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{route}_{request.reason}_{uuid.uuid4().hex[:8]}"
+    base = os.path.join(PROFILE_DIR, profile_id)
+    summary = io.StringIO()
+    stats = pstats.Stats(*profilers, stream=summary)
+    stats.dump_stats(base + ".prof")
+    stats.sort_stats("cumulative").print_stats(50)
+    with open(base + ".txt", "w") as f:
+        f.write(summary.getvalue())
+    request.profile_id = profile_id
+    PROFILES_SAVED.labels(reason=request.reason).inc()
+    _prune()
+
+
+def _prune():
+    profiles = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".prof"))
+    for name in profiles[:max(0, len(profiles) - MAX_PROFILES)]:
+        for ext in (".prof", ".txt"):
+            try:
+                os.unlink(os.path.join(PROFILE_DIR, name[:-5] + ext))
+            except FileNotFoundError:
+                pass
+
+
+def profile_section(fn, *args, **kwargs):
+    """Call ``fn`` under its own profiler when an async handler is being
+    profiled, e.g. ``await run_in_threadpool(profile_section, fn, ...)``."""
+    sections = _section_profiles.get()
+    if sections is None:
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        sections.append(profiler)
+
+
+def profiled(func):
+    """Run the handler under cProfile when the profiling middleware asked for it.
+
+    Applied to the handler itself rather than in the middleware because sync
+    handlers run in a worker thread. Work the handler offloads to other
+    thread pools (e.g. LLM calls) shows up as time spent waiting on them.
+
+    Async handlers run on the event loop, where a profiler would also record
+    every other request the loop serves meanwhile. For them only the
+    sections they run through ``profile_section`` are profiled, each in its
+    own worker thread, and the saved profile merges those sections.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            request = _profile_request.get()
+            if request is None or not _profiler_lock.acquire(blocking=False):
+                return await func(*args, **kwargs)
+            sections = []
+            token = _section_profiles.set(sections)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _section_profiles.reset(token)
+                if sections:
+                    _save(sections, request)
+                _profiler_lock.release()
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        request = _profile_request.get()
+        if request is None or not _profiler_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                _save([profiler], request)
+        finally:
+            _profiler_lock.release()
+    return wrapper
+
+
+def _wants_profile(scope):
+    headers = dict(scope.get("headers") or [])
+    flag = headers.get(b"x-profile", b"").decode() in ("1", "true")
+    if not flag:
+        query = scope.get("query_string", b"").decode()
+        flag = any(part in ("profile=1", "profile=true") for part in query.split("&"))
+    return flag and _is_admin(headers.get(b"x-admin-token", b"").decode())
+
+
+class ProfilingMiddleware:
+    """Marks a request for profiling when an admin asks for it
+    (``X-Profile: 1`` or ``?profile=1`` plus ``X-Admin-Token``) or when it is
+    the Nth request under ``profiling.sample_every``. The saved profile id
+    is returned in the ``X-Profile-Id`` response header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "").rstrip("/")
+        if scope["type"] != "http" or path not in PROFILED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        reason = None
+        if _wants_profile(scope):
+            reason = "requested"
+        elif SAMPLE_EVERY and next(_sample_counter) % SAMPLE_EVERY == 0:
+            reason = "sampled"
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        request = _ProfileRequest(reason, path)
+        token = _profile_request.set(request)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and request.profile_id:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", request.profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profile_request.reset(token)
+
+
+router = APIRouter(prefix="/profiles", tags=["profiling"])
+
+
+@router.get("")
+def list_profiles(x_admin_token: str | None = Header(default=None)):
+    _require_admin(x_admin_token)
+    if not os.path.isdir(PROFILE_DIR):
+        return {"profiles": []}
+    names = sorted((f[:-5] for f in os.listdir(PROFILE_DIR) if f.endswith(".prof")), reverse=True)
+    return {"profiles": names}
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str, format: str = "prof", x_admin_token: str | None = Header(default=None)):
+    """Download a saved profile: ``format=prof`` for the raw pstats dump
+    (open with snakeviz / pstats), ``format=text`` for the top-50 summary."""
+    _require_admin(x_admin_token)
+    if os.path.basename(profile_id) != profile_id or format not in ("prof", "text"):
+        raise HTTPException(status_code=400, detail="Invalid profile request")
+    path = os.path.join(PROFILE_DIR, profile_id + (".prof" if format == "prof" else ".txt"))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        with open(path) as f:
+            return PlainTextResponse(f.read())
+    return FileResponse(path, media_type="application/octet-stream", filename=profile_id + ".prof")
@@ -0,0 +1,56 @@
+"""Adjudicate a backlog of claim queries against one indexed session.
+
+Reads a CSV (``query`` column, optional ``claim_id``) or JSONL file and
+appends one JSON line per decided claim to --output as results complete.
+Rerunning with the same output resumes: claims already recorded are
+skipped. Use --fake-llm to run offline with the deterministic local model.
+Run from edjudicate_ai_app/:
+
+    python ../scripts/adjudicate_claims.py claims.csv --session 20250728_234512 --output results.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from edjudicate_ai_app.app.core import claims, engine  # noqa: E402
+from edjudicate_ai_app.app.core.fake_llm import fake_llm  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSONL file of claims")
+    parser.add_argument("--session", required=True, help="session whose index the claims are checked against")
+    parser.add_argument("--output", required=True, help="JSONL results file (appended to, and used for resuming)")
+    parser.add_argument("--concurrency", type=int, default=claims.CONCURRENCY, help="LLM calls in flight")
+    parser.add_argument("--batch", type=int, default=claims.BATCH, help="claims retrieved per batch")
+    parser.add_argument("--k", type=int, default=claims.K, help="clauses retrieved per claim")
+    parser.add_argument("--fake-llm", action="store_true", help="use the local deterministic model")
+    parser.add_argument("--restart", action="store_true", help="discard existing results first")
+    args = parser.parse_args()
+
+    with open(args.input, "rb") as f:
+        rows = claims.read_claims(f.read(), args.input)
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    if args.fake_llm:
+        engine.set_llm(fake_llm)
+
+    start = last_report = time.perf_counter()
+    records = []
+    for record in claims.adjudicate(rows, args.session, args.output, args.concurrency, args.batch, args.k):
+        records.append(record)
+        if record["error"]:
+            print(f"  {record['claim_id']}: {record['error']}")
+        now = time.perf_counter()
+        if now - last_report >= 10:
+            last_report = now
+            print(f"  {len(records)} claims, {len(records) / (now - start):.2f} claims/s")
+    summary = claims.summarize(records, time.perf_counter() - start, skipped=len(rows) - len(records))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Latency and recall@k of coarse-to-fine section search against a flat
+IndexFlatIP as the number of documents in a session grows.
+
+Synthetic documents are made of sections whose chunks cluster around a
+section topic; queries are perturbed chunks. Recall is measured against the
+exact flat search:
+
+    python scripts/bench_sections.py --documents 10,50,200,500 --top-sections 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from edjudicate_ai_app.app.core.section_index import SectionIndex  # noqa: E402
+
+
+def normalize(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype("float32")
+
+
+def corpus(documents, sections, chunks, dim, rng):
+    topics = rng.standard_normal((documents * sections, dim))
+    chunk_sections = np.repeat(np.arange(documents * sections), chunks)
+    vectors = normalize(topics[chunk_sections] + 0.8 * rng.standard_normal((len(chunk_sections), dim)))
+    return vectors, chunk_sections
+
+
+def per_query_ms(fn, queries):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) / queries * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", default="10,50,200,500")
+    parser.add_argument("--sections", type=int, default=40, help="sections per document")
+    parser.add_argument("--chunks", type=int, default=6, help="chunks per section")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--top-sections", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'docs':>6} {'chunks':>8} {'flat ms':>8} {'sections ms':>12} {'recall@' + str(args.k):>9}")
+    for documents in map(int, args.documents.split(",")):
+        vectors, chunk_sections = corpus(documents, args.sections, args.chunks, args.dim, rng)
+        picks = vectors[rng.integers(len(vectors), size=args.queries)]
+        q = normalize(picks + 0.03 * rng.standard_normal(picks.shape))
+
+        flat = faiss.IndexFlatIP(args.dim)
+        flat.add(vectors)
+        sections = SectionIndex.build(chunk_sections, vectors, [""] * (documents * args.sections))
+
+        # One query at a time, as the API issues them
+        truth, flat_ms = per_query_ms(lambda: [flat.search(q[i:i + 1], args.k)[1][0] for i in range(len(q))], len(q))
+        found, section_ms = per_query_ms(
+            lambda: [sections.search(q[i:i + 1], vectors, args.k, args.top_sections)[1][0] for i in range(len(q))],
+            len(q))
+        recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+        print(f"{documents:>6} {len(vectors):>8} {flat_ms:>8.3f} {section_ms:>12.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
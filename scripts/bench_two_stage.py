@@ -0,0 +1,82 @@
+"""Recall@k and latency of two-stage (binary code + exact re-score) search
+against exact IndexFlatIP ground truth.
+
+Uses clustered synthetic vectors by default, or the stored vectors of a
+real session (queries are then perturbed copies of stored vectors):
+
+    python scripts/bench_two_stage.py --n 200000
+    python scripts/bench_two_stage.py --vectors edjudicate_ai_app/data/session_<id>/backup/vectors.npy
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from edjudicate_ai_app.app.core.quantized import binarize, two_stage_search  # noqa: E402
+
+
+def normalize(x):
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype("float32")
+
+
+def synthetic(n, dim, queries, clusters, rng):
+    centers = rng.standard_normal((clusters, dim))
+    base = centers[rng.integers(clusters, size=n)] + 0.6 * rng.standard_normal((n, dim))
+    q = centers[rng.integers(clusters, size=queries)] + 0.6 * rng.standard_normal((queries, dim))
+    return normalize(base), normalize(q)
+
+
+def from_file(path, queries, rng):
+    base = np.load(path, mmap_mode="r")
+    picks = base[rng.integers(len(base), size=queries)]
+    return np.ascontiguousarray(base, dtype="float32"), normalize(picks + 0.05 * rng.standard_normal(picks.shape))
+
+
+def timed_per_query(fn, queries):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) / queries * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--vectors", help="use a session's vectors.npy instead of synthetic data")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", default="50,100,200,500,1000")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.vectors:
+        base, q = from_file(args.vectors, args.queries, rng)
+    else:
+        base, q = synthetic(args.n, args.dim, args.queries, args.clusters, rng)
+    n, dim = base.shape
+
+    flat = faiss.IndexFlatIP(dim)
+    flat.add(base)
+    (_, truth), flat_ms = timed_per_query(lambda: flat.search(q, args.k), len(q))
+    # One query at a time, as the API issues them
+    _, flat_single_ms = timed_per_query(lambda: [flat.search(q[i:i + 1], args.k) for i in range(len(q))], len(q))
+    codes = binarize(base)
+
+    print(f"n={n} dim={dim} k={args.k} queries={len(q)}")
+    print(f"memory: float32 {base.nbytes / 2**20:.1f} MiB, codes {codes.nbytes / 2**20:.1f} MiB")
+    print(f"IndexFlatIP       batched {flat_ms:.3f} ms/query, single {flat_single_ms:.3f} ms/query")
+    for candidates in map(int, args.candidates.split(",")):
+        (_, found), ms = timed_per_query(
+            lambda: two_stage_search(q, codes, base, args.k, candidates), len(q))
+        recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+        print(f"two-stage c={candidates:<5} recall@{args.k} {recall:.3f}  {ms:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Compare the per-session index files with the shared vector store.
+
+Builds N synthetic sessions in both layouts and reports build time, file
+count, disk use, per-query latency (cold: every query opens its session's
+files, as a worker without the index cache does) and removal cost.
+
+    python scripts/bench_vector_store.py --sessions 10000
+"""
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from edjudicate_ai_app.app.core.vector_store import SharedVectorStore  # noqa: E402
+
+
+def disk_usage(path):
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):.3f} ms  p99 {np.percentile(ms, 99):.3f} ms"
+
+
+def make_session(rng, chunks, dim):
+    vectors = rng.standard_normal((chunks, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [f"chunk {i}" for i in range(chunks)], vectors
+
+
+def bench_files(root, sessions, chunks, dim, queries, k, seed):
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for s in range(sessions):
+        texts, vectors = make_session(rng, chunks, dim)
+        base = os.path.join(root, f"session_{s}", "backup")
+        os.makedirs(base)
+        index = faiss.IndexFlatIP(dim)
+        index.add(vectors)
+        faiss.write_index(index, os.path.join(base, "faiss.index"))
+        with open(os.path.join(base, "chunks.pkl"), "wb") as f:
+            pickle.dump(texts, f)
+    build = time.perf_counter() - start
+    usage = disk_usage(root)
+
+    latencies = []
+    for q in range(queries):
+        s = rng.integers(sessions)
+        q_vec = rng.standard_normal((1, dim)).astype("float32")
+        t = time.perf_counter()
+        base = os.path.join(root, f"session_{s}", "backup")
+        index = faiss.read_index(os.path.join(base, "faiss.index"))
+        with open(os.path.join(base, "chunks.pkl"), "rb") as f:
+            texts = pickle.load(f)
+        _, rows = index.search(q_vec, k)
+        [texts[i] for i in rows[0] if i >= 0]
+        latencies.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for s in range(sessions // 10):
+        shutil.rmtree(os.path.join(root, f"session_{s}"))
+    remove = (time.perf_counter() - t) / max(1, sessions // 10)
+    return build, usage, latencies, remove
+
+
+def bench_shared(root, sessions, chunks, dim, queries, k, seed, shards):
+    rng = np.random.default_rng(seed)
+    store = SharedVectorStore(root, dim, shards=shards)
+    start = time.perf_counter()
+    for s in range(sessions):
+        texts, vectors = make_session(rng, chunks, dim)
+        store.add(f"{s}", texts, vectors)
+    build = time.perf_counter() - start
+    usage = disk_usage(root)
+
+    # A fresh store replays the shard logs, as a newly started worker would.
+    t = time.perf_counter()
+    store = SharedVectorStore(root, dim, shards=shards)
+    for shard in store._shards:
+        shard.sync()
+    warm = time.perf_counter() - t
+
+    latencies = []
+    for q in range(queries):
+        s = rng.integers(sessions)
+        q_vec = rng.standard_normal((1, dim)).astype("float32")
+        t = time.perf_counter()
+        store.search(f"{s}", q_vec, k)
+        latencies.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for s in range(sessions // 10):
+        store.remove(f"{s}")
+    remove = (time.perf_counter() - t) / max(1, sessions // 10)
+    return build, usage, latencies, remove, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--chunks", type=int, default=40, help="chunks per session")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_vector_store_")
+    try:
+        files_dir, shared_dir = os.path.join(root, "files"), os.path.join(root, "shared")
+        os.makedirs(files_dir)
+
+        build, (files, size), latencies, remove = bench_files(files_dir, args.sessions, args.chunks, args.dim,
+                                                               args.queries, args.k, args.seed)
+        print(f"per-session files  build {build:.1f} s  files {files}  disk {size / 2**20:.1f} MiB")
+        print(f"  query (cold open + search)  {percentiles(latencies)}")
+        print(f"  remove session  {remove * 1000:.3f} ms")
+
+        build, (files, size), latencies, remove, warm = bench_shared(shared_dir, args.sessions, args.chunks, args.dim,
+                                                                      args.queries, args.k, args.seed, args.shards)
+        print(f"shared store       build {build:.1f} s  files {files}  disk {size / 2**20:.1f} MiB")
+        print(f"  worker start (replay {args.shards} shards)  {warm:.2f} s")
+        print(f"  query (range search)  {percentiles(latencies)}")
+        print(f"  remove session  {remove * 1000:.3f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
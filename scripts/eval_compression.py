@@ -0,0 +1,94 @@
+"""Compression ratio and answer parity of extractive prompt compression.
+
+Indexes a policy document, retrieves clauses for a fixed question set and
+answers each question twice with the local fake LLM: once with the full
+clauses and once compressed. Reports the character ratio per question and
+how many answers stayed identical. Run from edjudicate_ai_app/:
+
+    python ../scripts/eval_compression.py --document data/docs/policy.pdf
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from edjudicate_ai_app.app.core import compress, engine  # noqa: E402
+from edjudicate_ai_app.app.core.fake_llm import fake_llm  # noqa: E402
+from edjudicate_ai_app.app.core.retriever import build_index, retrieve_chunks  # noqa: E402
+from edjudicate_ai_app.app.ingestion.chunk import chunk_text  # noqa: E402
+from edjudicate_ai_app.app.ingestion.load import load_content  # noqa: E402
+
+QUESTIONS = [
+    "What is the grace period for premium payment?",
+    "What is the waiting period for pre-existing diseases?",
+    "Does this policy cover maternity expenses?",
+    "What is the waiting period for cataract surgery?",
+    "Are organ donor medical expenses covered?",
+    "What is the No Claim Discount offered?",
+    "Is there a benefit for preventive health check-ups?",
+    "How is a hospital defined?",
+    "Are AYUSH treatments covered?",
+    "What are the sub-limits on room rent and ICU charges?",
+]
+
+SAMPLE_POLICY = """
+Section 1.1 Grace Period. A grace period of thirty days is provided for premium payment after the due date.
+Coverage continues during the grace period. Policies not renewed within the grace period lapse.
+Section 2.4 Pre-existing Diseases. Expenses related to pre-existing diseases are covered after a waiting period of 36 months of continuous coverage.
+The waiting period is reduced by the years of continuous cover under an earlier policy.
+Section 3.2 Maternity. Maternity expenses, including childbirth and lawful termination, are covered after 24 months of continuous coverage.
+Maternity benefit is limited to two deliveries during the policy period.
+Section 3.5 Cataract. Cataract surgery has a specific waiting period of two years.
+The benefit for cataract is limited to 25,000 per eye.
+Section 3.7 Organ Donor. Medical expenses for an organ donor's hospitalisation are covered when the organ is for an insured person.
+Section 4.1 No Claim Discount. A No Claim Discount of 5% on the base premium is offered at renewal for a claim-free year.
+The aggregate discount is capped at 5% of the total base premium.
+Section 4.3 Health Check-up. Expenses for preventive health check-ups are reimbursed at the end of every block of two policy years.
+Section 5.1 Hospital. A hospital is an institution with at least 10 inpatient beds in towns below ten lakh population and 15 beds elsewhere.
+It must have qualified nursing staff round the clock and a fully equipped operation theatre.
+Section 5.6 AYUSH. Inpatient treatment under Ayurveda, Yoga, Naturopathy, Unani, Siddha and Homeopathy is covered up to the sum insured in an AYUSH hospital.
+Section 6.2 Room Rent. For Plan A, daily room rent is capped at 1% of the sum insured and ICU charges at 2% of the sum insured.
+Sub-limits do not apply to treatment in a preferred provider network hospital.
+Section 7 General Conditions. The insured must notify the insurer of a claim within the stipulated time.
+All documents should be submitted within thirty days of discharge from hospital.
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--document", help="PDF/DOCX to index (a built-in sample policy otherwise)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=compress.BUDGET_CHARS)
+    parser.add_argument("--neighbors", type=int, default=compress.NEIGHBORS)
+    parser.add_argument("--session", default="eval_compression")
+    args = parser.parse_args()
+
+    text = load_content(args.document) if args.document else SAMPLE_POLICY
+    build_index(chunk_text(text), args.session, True)
+    engine.set_llm(fake_llm)
+    # The engine compresses with the module settings; use the requested ones
+    compress.BUDGET_CHARS, compress.NEIGHBORS = args.budget, args.neighbors
+
+    total_in = total_out = same = 0
+    for question in QUESTIONS:
+        chunks = retrieve_chunks(question, args.session, k=args.k)
+        compress.ENABLED = False
+        full = engine.answer_from_chunks(question, chunks)
+        kept = compress.compress_chunks(question, chunks, args.budget, args.neighbors)
+        compress.ENABLED = True
+        short = engine.answer_from_chunks(question, chunks)
+
+        size_in, size_out = sum(map(len, chunks)), sum(map(len, kept))
+        total_in += size_in
+        total_out += size_out
+        same += full == short
+        print(f"{size_out / max(size_in, 1):5.2f}  {'same' if full == short else 'DIFF'}  {question}")
+        if full != short:
+            print(f"        full:       {full}\n        compressed: {short}")
+
+    print(f"\noverall ratio {total_out / max(total_in, 1):.2f} ({total_in} -> {total_out} chars), "
+          f"answer parity {same}/{len(QUESTIONS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,234 @@
-from app.ingestion.load import load_content
-from app.ingestion.chunk import chunk_text
-from app.core.retriever import build_index
-
-file_path = "data/docs/sample_policy.pdf"
-text = load_content(file_path)
-chunks = chunk_text(text)
-build_index(chunks, force_rebuild=True)
\ No newline at end of file
+"""Offline bulk indexer: build one consolidated session index from a
+directory tree of PDF/DOCX policies.
+
+Files are extracted and chunked in a process pool while the main process
+embeds the chunks in large batches. Every batch is checkpointed as a part
+file, so an interrupted run picks up where it stopped when started again
+with the same arguments (pass --restart to discard the checkpoint). The
+finished index is written as session ``--session`` and can be queried like
+any other session, e.g. through /query/federated. Run from
+edjudicate_ai_app/:
+
+    python ../scripts/index_build.py data/docs --session corpus --workers 8 --batch 512
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from edjudicate_ai_app.app.core.sessions import DATA_DIR  # noqa: E402
+from edjudicate_ai_app.app.ingestion import dedup  # noqa: E402
+from edjudicate_ai_app.app.ingestion.sections import file_chunks  # noqa: E402
+
+EXTENSIONS = (".pdf", ".docx")
+
+
+def find_files(directory):
+    found = []
+    for root, _, names in os.walk(directory):
+        found.extend(os.path.join(root, name) for name in names if name.lower().endswith(EXTENSIONS))
+    return sorted(os.path.relpath(path, directory) for path in found)
+
+
+def extract(directory, relpath):
+    """Runs in a pool process: (relpath, (section, title, chunk) triples, error)."""
+    try:
+        return relpath, file_chunks(os.path.join(directory, relpath)), None
+    except Exception as e:
+        return relpath, [], f"{type(e).__name__}: {e}"
+
+
+class Checkpoint:
+    """Part files in a work directory. ``part-NNNNNN.npy`` holds a batch's
+    vectors and ``part-NNNNNN.json`` its chunks, provenance and the files it
+    completed; the JSON is renamed into place last, so a part without one is
+    ignored (and overwritten) on resume."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.parts = sorted(glob.glob(os.path.join(directory, "part-*.json")))
+
+    def load_parts(self):
+        for path in self.parts:
+            with open(path) as f:
+                yield path[:-len(".json")], json.load(f)
+
+    def write(self, vectors, meta):
+        base = os.path.join(self.directory, f"part-{len(self.parts):06d}")
+        np.save(base + ".npy", np.asarray(vectors, dtype="float32"))
+        with open(base + ".json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(base + ".json.tmp", base + ".json")
+        self.parts.append(base + ".json")
+
+
+class Builder:
+    def __init__(self, checkpoint, batch):
+        self.checkpoint = checkpoint
+        self.batch = batch
+        self.duplicates = dedup.Deduplicator() if dedup.DEDUP else None
+        self.kept = 0
+        self.done = set()
+        self.pending = self._empty()
+        self.files_done = self.chunks_done = self.embedded = 0
+        self.embed_seconds = 0.0
+
+    @staticmethod
+    def _empty():
+        return {"chunks": [], "sources": [], "sections": [], "titles": {}, "duplicates": [], "files": [], "failed": []}
+
+    def resume(self):
+        """Replay existing parts: completed files, and the duplicate filter's
+        state so chunks seen before the interruption are still recognised."""
+        for _, meta in self.checkpoint.load_parts():
+            self.done.update(meta["files"])
+            self.done.update(name for name, _ in meta["failed"])
+            if self.duplicates is not None:
+                for chunk, source in zip(meta["chunks"], meta["sources"]):
+                    self.duplicates.add(chunk, source)
+            self.kept += len(meta["chunks"])
+        return len(self.done)
+
+    def add(self, relpath, pieces, error):
+        part = self.pending
+        if error is not None:
+            part["failed"].append([relpath, error])
+        for position, (section, title, chunk) in enumerate(pieces):
+            source = [relpath, position]
+            part["titles"].setdefault(relpath, {})[str(section)] = title
+            if self.duplicates is not None:
+                kept = self.duplicates.add(chunk, source)
+                if kept < self.kept + len(part["chunks"]):
+                    part["duplicates"].append([kept, source])
+                    continue
+            part["chunks"].append(chunk)
+            part["sources"].append(source)
+            part["sections"].append([relpath, section])
+        if error is None:
+            part["files"].append(relpath)
+        self.files_done += 1
+        self.chunks_done += len(pieces)
+        if len(part["chunks"]) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        part = self.pending
+        if not (part["chunks"] or part["files"] or part["failed"]):
+            return
+        start = time.perf_counter()
+        # Imported here so pool processes never load the embedding model
+        from edjudicate_ai_app.app.core.embedder import embed_texts
+        vectors = embed_texts(part["chunks"]) if part["chunks"] else np.zeros((0, 0), dtype="float32")
+        self.embed_seconds += time.perf_counter() - start
+        self.embedded += len(part["chunks"])
+        self.checkpoint.write(vectors, part)
+        self.kept += len(part["chunks"])
+        self.pending = self._empty()
+
+
+def assemble(checkpoint, session):
+    """Merge every part into one index for ``session``."""
+    from edjudicate_ai_app.app.core.retriever import build_index_from_vectors
+
+    vectors, chunks, sources, chunk_sections, titles, duplicates = [], [], [], [], {}, []
+    for base, meta in checkpoint.load_parts():
+        if meta["chunks"]:
+            vectors.append(np.load(base + ".npy"))
+        chunks.extend(meta["chunks"])
+        sources.extend([source] for source in meta["sources"])
+        chunk_sections.extend(tuple(key) for key in meta["sections"])
+        for relpath, by_section in meta["titles"].items():
+            titles.setdefault(relpath, {}).update(by_section)
+        duplicates.extend(meta["duplicates"])
+    if not chunks:
+        raise SystemExit("No text was extracted; nothing to index.")
+    for kept, source in duplicates:
+        sources[kept].append(source)
+
+    # Number sections by document, in the order documents were indexed
+    documents = {relpath: n for n, relpath in enumerate(titles)}
+    keys = sorted(set(chunk_sections), key=lambda key: (documents[key[0]], key[1]))
+    number = {key: n for n, key in enumerate(keys)}
+    sections = (
+        [titles[relpath][str(section)] for relpath, section in keys],
+        [number[key] for key in chunk_sections],
+        [documents[relpath] for relpath, _ in keys],
+    )
+    provenance = {"original_chunks": len(chunks) + len(duplicates), "sources": sources}
+    build_index_from_vectors(chunks, np.vstack(vectors), session, provenance, sections)
+    return len(chunks), len(duplicates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory searched recursively for .pdf and .docx files")
+    parser.add_argument("--session", default="corpus", help="session id of the consolidated index")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="extraction processes")
+    parser.add_argument("--batch", type=int, default=512, help="chunks embedded (and checkpointed) per batch")
+    parser.add_argument("--checkpoint", help="work directory (default: <data>/index_build/<session>)")
+    parser.add_argument("--restart", action="store_true", help="discard an existing checkpoint")
+    parser.add_argument("--keep-checkpoint", action="store_true", help="keep the part files after a full build")
+    args = parser.parse_args()
+
+    work = args.checkpoint or os.path.join(DATA_DIR, "index_build", args.session)
+    if args.restart and os.path.isdir(work):
+        shutil.rmtree(work)
+    checkpoint = Checkpoint(work)
+    builder = Builder(checkpoint, args.batch)
+    resumed = builder.resume()
+
+    files = find_files(args.directory)
+    todo = [relpath for relpath in files if relpath not in builder.done]
+    print(f"{len(files)} files, {resumed} already indexed, {len(todo)} to go "
+          f"({args.workers} workers, batch {args.batch})")
+
+    start = last_report = time.perf_counter()
+    # Spawned workers do not inherit the parent's threads or model state
+    with ProcessPoolExecutor(args.workers, mp_context=get_context("spawn")) as pool:
+        # Keep a bounded window of files in flight so memory stays flat
+        remaining = iter(todo)
+        queue = deque(pool.submit(extract, args.directory, relpath)
+                      for relpath in islice(remaining, args.workers * 4))
+        while queue:
+            relpath, pieces, error = queue.popleft().result()
+            following = next(remaining, None)
+            if following is not None:
+                queue.append(pool.submit(extract, args.directory, following))
+            if error is not None:
+                print(f"  failed: {relpath}: {error}")
+            builder.add(relpath, pieces, error)
+            now = time.perf_counter()
+            if now - last_report >= 10:
+                last_report = now
+                report(builder, now - start)
+        builder.flush()
+
+    elapsed = time.perf_counter() - start
+    report(builder, elapsed)
+    kept, removed = assemble(checkpoint, args.session)
+    print(f"indexed {kept} chunks into session {args.session} ({removed} near-duplicates removed) "
+          f"in {time.perf_counter() - start:.1f}s")
+    if not args.keep_checkpoint:
+        shutil.rmtree(work)
+
+
+def report(builder, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    print(f"  {builder.files_done} docs, {builder.chunks_done} chunks in {elapsed:.1f}s: "
+          f"{builder.files_done / elapsed:.1f} docs/s, {builder.chunks_done / elapsed:.0f} chunks/s, "
+          f"embed {builder.embedded / max(builder.embed_seconds, 1e-9):.0f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,16 @@ model = genai.GenerativeModel("gemini-2.0-flash")
 # Initialize embedding model
 @st.cache_resource
 def get_embedding_model():
+    # Use the shared embedding server when it is configured and running
+    service = cfg.get("embedding_service") or {}
+    if service.get("enabled"):
+        from edjudicate_ai_app.app.core.embed_service import EmbeddingClient, EmbeddingServiceError
+        client = EmbeddingClient(service.get("socket", "/tmp/edjudicate_embed.sock"))
+        try:
+            client.encode(["ping"])
+            return client
+        except (OSError, EmbeddingServiceError):
+            pass
     return SentenceTransformer('all-MiniLM-L6-v2')
 
 embedding_model = get_embedding_model()
@@ -0,0 +1,29 @@
+"""Shared fixtures. The app is imported as ``edjudicate_ai_app.app`` and, like
+the server and the scripts, runs from edjudicate_ai_app/: the engine and the
+retriever read config/config.yaml relative to the working directory when they
+are imported, so tests import them inside fixtures, after ``app_dir``."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app_dir():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(os.path.join(ROOT, "edjudicate_ai_app"))
+        yield
+
+
+@pytest.fixture
+def fake_llm():
+    """Answer with the deterministic local model instead of Gemini."""
+    from edjudicate_ai_app.app.core import engine
+    from edjudicate_ai_app.app.core.fake_llm import fake_llm
+
+    engine.set_llm(fake_llm)
+    yield fake_llm
+    engine.set_llm(None)
@@ -0,0 +1,103 @@
+"""Prompt compression: the ratio it records and answer parity with the fake LLM."""
+import hashlib
+
+import numpy as np
+import pytest
+
+from edjudicate_ai_app.app.core import compress
+from edjudicate_ai_app.app.core.fake_llm import NOT_FOUND, _words
+
+CLAUSES = [
+    "Section 1.1 Grace Period. A grace period of thirty days is allowed for premium payment after the due date. "
+    "Coverage continues during the grace period. Policies not renewed within the grace period lapse. "
+    "Section 2.4 Pre-existing Diseases. Pre-existing diseases are covered after a waiting period of 36 months. "
+    "The waiting period is reduced by the years of continuous cover under an earlier policy.",
+    "Section 3.2 Maternity. Maternity expenses including childbirth are covered after 24 months of cover. "
+    "The maternity benefit is limited to two deliveries during the policy period. "
+    "Section 3.5 Cataract. Cataract surgery has a specific waiting period of two years. "
+    "The benefit for cataract is limited to 25,000 per eye.",
+    "Section 4.1 No Claim Discount. A No Claim Discount of 5% on the base premium is offered at renewal. "
+    "The aggregate discount is capped at 5% of the total base premium. "
+    "Section 6.2 Room Rent. Daily room rent is capped at 1% of the sum insured. "
+    "ICU charges are capped at 2% of the sum insured. "
+    "Sub-limits do not apply in a preferred provider network hospital.",
+]
+
+QUESTIONS = [
+    "What is the grace period for premium payment?",
+    "After how many months are pre-existing diseases covered?",
+    "How many deliveries does the maternity benefit cover?",
+    "What is the cataract benefit limit per eye?",
+    "What No Claim Discount is offered at renewal?",
+    "What is the cap on ICU charges?",
+]
+
+BUDGET = 400
+
+
+def bag_of_words(texts, dim=1024):
+    """Hashed word counts, so sentence ranking follows word overlap as the
+    fake LLM's does, whatever embedding model is installed."""
+    vectors = np.zeros((len(texts), dim), dtype="float32")
+    for row, text in enumerate(texts):
+        for word in _words(text):
+            vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1
+    return vectors
+
+
+@pytest.fixture
+def engine():
+    from edjudicate_ai_app.app.core import engine
+
+    return engine
+
+
+@pytest.fixture(autouse=True)
+def word_embeddings(monkeypatch):
+    monkeypatch.setattr(compress, "embed_texts", bag_of_words)
+    monkeypatch.setattr(compress, "BUDGET_CHARS", BUDGET)
+    monkeypatch.setattr(compress, "NEIGHBORS", 0)
+
+
+def test_ratio_metric_matches_output():
+    ratios = compress.COMPRESSION_RATIO.labels()
+    saved = compress.CHARS_SAVED.labels()
+    count, total, chars = ratios.count, ratios.sum, saved.value
+
+    kept = compress.compress_chunks(QUESTIONS[0], CLAUSES, BUDGET, 0)
+
+    original, size = sum(map(len, CLAUSES)), sum(map(len, kept))
+    assert ratios.count == count + 1
+    assert ratios.sum - total == pytest.approx(size / original)
+    assert saved.value - chars == original - size
+    assert size / original < 0.5
+
+
+def test_short_prompts_are_not_compressed():
+    ratios = compress.COMPRESSION_RATIO.labels()
+    count = ratios.count
+    assert compress.compress_chunks(QUESTIONS[0], CLAUSES[:1], 10_000) == CLAUSES[:1]
+    assert ratios.count == count
+
+
+def test_engine_uses_current_settings(engine, monkeypatch):
+    prompts = []
+    monkeypatch.setattr(engine, "_llm", lambda prompt, timeout: prompts.append(prompt) or "")
+    monkeypatch.setattr(compress, "ENABLED", True)
+    engine.answer_from_chunks(QUESTIONS[0], CLAUSES)
+    monkeypatch.setattr(compress, "BUDGET_CHARS", 10_000)
+    engine.answer_from_chunks(QUESTIONS[0], CLAUSES)
+    assert len(prompts[0]) < len(prompts[1])
+    assert all(clause in prompts[1] for clause in CLAUSES)
+
+
+@pytest.mark.parametrize("neighbors", [0, 1])
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_answer_parity(engine, fake_llm, monkeypatch, question, neighbors):
+    monkeypatch.setattr(compress, "NEIGHBORS", neighbors)
+    monkeypatch.setattr(compress, "ENABLED", False)
+    full = engine.answer_from_chunks(question, CLAUSES)
+    monkeypatch.setattr(compress, "ENABLED", True)
+    short = engine.answer_from_chunks(question, CLAUSES)
+    assert full != NOT_FOUND
+    assert short == full
@@ -0,0 +1,157 @@
+"""URL document cache against a local HTTP server: a first fetch indexes the
+document, repeat fetches revalidate with ETag / Last-Modified and skip
+downloading and embedding, and the same bytes behind another URL reuse the
+existing session."""
+import importlib.util
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from edjudicate_ai_app.app.core.doc_cache import DOC_CACHE_RESULTS, DocumentCache, content_hash, session_id_for
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+POLICY = b"%PDF-1.4 policy v1"
+UPDATED = b"%PDF-1.4 policy v2"
+LAST_MODIFIED = "Mon, 06 Oct 2025 10:00:00 GMT"
+
+
+class PolicyServer(ThreadingHTTPServer):
+    """Serves ``documents`` (path -> (body, etag or None)) with a fixed
+    Last-Modified and honours conditional GETs; every response is logged."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.documents = {}
+        self.log = []
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body, etag = self.server.documents[self.path.split("?")[0]]
+        conditional = {name: self.headers.get(name) for name in ("If-None-Match", "If-Modified-Since")}
+        if etag is not None and conditional["If-None-Match"] is not None:
+            not_modified = conditional["If-None-Match"] == etag
+        else:
+            not_modified = conditional["If-Modified-Since"] == LAST_MODIFIED
+        self.server.log.append((self.path, 304 if not_modified else 200, conditional))
+
+        self.send_response(304 if not_modified else 200)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def main():
+    spec = importlib.util.spec_from_file_location("deployed_main", os.path.join(ROOT, "app", "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    httpd = PolicyServer()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def indexed(main, monkeypatch, tmp_path):
+    """Sessions "indexed" so far, in order; stands in for extraction and embedding."""
+    sessions = []
+    monkeypatch.setattr(main, "document_cache",
+                        DocumentCache(str(tmp_path / "url_cache"), max_age=0, index_exists=sessions.__contains__))
+    monkeypatch.setattr(main, "_index_pdf_bytes", lambda content, session_id: sessions.append(session_id))
+    return sessions
+
+
+def outcomes():
+    return {key[0]: child.value for key, child in DOC_CACHE_RESULTS.children()}
+
+
+def delta(before):
+    after = outcomes()
+    return {result: after[result] - before.get(result, 0) for result in after if after[result] != before.get(result, 0)}
+
+
+def test_miss_revalidate_and_same_content(main, server, indexed):
+    server.documents["/policy.pdf"] = (POLICY, '"v1"')
+    server.documents["/mirror.pdf"] = (POLICY, None)
+    signed = server.url("/policy.pdf?sig=1")
+    expected = session_id_for(content_hash(POLICY))
+
+    # First fetch downloads and indexes
+    before = outcomes()
+    assert main._session_for_document(signed) == expected
+    assert indexed == [expected]
+    assert server.log[-1] == ("/policy.pdf?sig=1", 200, {"If-None-Match": None, "If-Modified-Since": None})
+    assert delta(before) == {"miss": 1}
+
+    # Same URL: conditional GET answered with 304, nothing downloaded or embedded
+    before = outcomes()
+    assert main._session_for_document(signed) == expected
+    assert server.log[-1] == ("/policy.pdf?sig=1", 304, {"If-None-Match": '"v1"', "If-Modified-Since": LAST_MODIFIED})
+    assert indexed == [expected]
+    assert delta(before) == {"revalidated": 1}
+
+    # Same bytes behind another URL: downloaded once, matched by hash, not embedded
+    before = outcomes()
+    mirror = server.url("/mirror.pdf")
+    assert main._session_for_document(mirror) == expected
+    assert server.log[-1][1] == 200
+    assert indexed == [expected]
+    assert delta(before) == {"same_content": 1}
+
+    # Without an ETag the server revalidates on Last-Modified alone
+    before = outcomes()
+    assert main._session_for_document(mirror) == expected
+    assert server.log[-1] == ("/mirror.pdf", 304, {"If-None-Match": None, "If-Modified-Since": LAST_MODIFIED})
+    assert indexed == [expected]
+    assert delta(before) == {"revalidated": 1}
+
+
+def test_changed_document_is_reindexed(main, server, indexed):
+    server.documents["/policy.pdf"] = (POLICY, '"v1"')
+    url = server.url("/policy.pdf")
+    first = main._session_for_document(url)
+
+    server.documents["/policy.pdf"] = (UPDATED, '"v2"')
+    before = outcomes()
+    second = main._session_for_document(url)
+    assert server.log[-1] == ("/policy.pdf", 200, {"If-None-Match": '"v1"', "If-Modified-Since": LAST_MODIFIED})
+    assert second == session_id_for(content_hash(UPDATED)) != first
+    assert indexed == [first, second]
+    assert delta(before) == {"miss": 1}
+
+
+def test_fresh_entry_skips_the_request(main, server, indexed):
+    server.documents["/policy.pdf"] = (POLICY, '"v1"')
+    url = server.url("/policy.pdf")
+    main.document_cache.max_age = 3600
+    session_id = main._session_for_document(url)
+    requests_made = len(server.log)
+
+    before = outcomes()
+    assert main._session_for_document(url) == session_id
+    assert len(server.log) == requests_made
+    assert delta(before) == {"fresh": 1}